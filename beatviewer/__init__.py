@@ -8,11 +8,13 @@ import sounddevice
 
 from .handlers import HANDLER_LIST
 from .tools import TOOL_LIST
+from .analysis_cache import AnalysisCache
 from .beat_tracker import BeatTracker
 from .beat_tracker_process import BeatTrackerProcess
 from .config import Config
 from .audio_source.live_audio_source import LiveAudioSource
 from .audio_source.file_audio_source import FileAudioSource
+from .audio_source.ffmpeg_audio_source import FFmpegAudioSource
 
 
 def print_table(table, padx=4):
@@ -69,12 +71,15 @@ def main():
     logging.info("Main process has PID %d", os.getpid())
     parser = argparse.ArgumentParser(formatter_class=argparse.ArgumentDefaultsHelpFormatter)
     parser.add_argument("-a", "--audio-device", type=int, default=sounddevice.default.device[0], help="Audio device index")
+    parser.add_argument("-q", "--queue-size", type=int, default=0, help="Capture live audio in a callback feeding a queue of this many hops (0 for blocking reads)")
     parser.add_argument("-l", "--list-audio-devices", action="store_true", help="Show the list of available audio devices and exit")
     parser.add_argument("-f", "--audio-file", type=str, default=None, help="Path to a local audio file for 'offline' beat tracking")
     parser.add_argument("-t", "--realtime", action="store_true", help="Make offline beat tracking realtime")
+    parser.add_argument("-s", "--stream", action="store_true", help="Read the audio file block by block instead of loading it in memory")
     parser.add_argument("-g", "--graph", action="store_true", help="Plot extracted audio features for in-depth analysis")
     parser.add_argument("-gf", "--graph-fps", type=float, default=15, help="Refresh rate for the audio features graph")
     parser.add_argument("-c", "--config", type=str, default=None, help="Path to a configuration file (see default 'config.txt')")
+    parser.add_argument("-F", "--follower-config", type=str, action="append", default=[], help="Path to a configuration file for an additional tracker sharing the spectral flux of the main one (can be repeated). Its events are exported next to the output path")
     parser.add_argument("-k", "--keyboard-events", action="store_true", help="Monitor keyboard events")
     parser.add_argument("-r", "--record-path", type=str, default=None, help="Record the the audio stream to a local file")
     parser.add_argument("-o", "--output-path", type=str, default=None, help="Export the beats, onsets and BPM data to a JSON file")
@@ -102,9 +107,11 @@ def main():
         config = Config()
 
     if args.audio_file is None:
-        audio_source = LiveAudioSource(config, args.audio_device, args.record_path)
+        audio_source = LiveAudioSource(config, args.audio_device, args.record_path, queue_size=args.queue_size)
+    elif not FileAudioSource.is_supported(args.audio_file):
+        audio_source = FFmpegAudioSource(config, args.audio_file, realtime=args.realtime, record_path=args.record_path)
     else:
-        audio_source = FileAudioSource(config, args.audio_file, realtime=args.realtime, record_path=args.record_path)
+        audio_source = FileAudioSource(config, args.audio_file, realtime=args.realtime, record_path=args.record_path, streaming=args.stream)
 
     tracker_kwargs = {
         "show_graph": args.graph,
@@ -114,14 +121,28 @@ def main():
         "warmup": args.warmup
     }
 
+    followers = []
+    for i, follower_config_path in enumerate(args.follower_config):
+        logging.info("Loading follower config from %s", follower_config_path)
+        follower_output_path = None
+        if args.output_path is not None:
+            root, ext = os.path.splitext(args.output_path)
+            follower_output_path = f"{root}.{i + 1}{ext}"
+        followers.append(BeatTracker(Config.from_file(follower_config_path), audio_source, output_path=follower_output_path))
+
     if args.action is None:
         def beat_callback():
             print(".", end="", flush=True)
-        BeatTracker(config, audio_source, beat_callback=beat_callback, **tracker_kwargs).run()
+        tracker = BeatTracker(config, audio_source, beat_callback=beat_callback, **tracker_kwargs)
+        for follower in followers:
+            tracker.add_follower(follower)
+        tracker.run()
     else:
         conn1, conn2 = multiprocessing.Pipe()
-        tracker = BeatTrackerProcess(config, audio_source, conn1, **tracker_kwargs)
         handler = get_action_handler(args, conn2)
+        tracker = BeatTrackerProcess(config, audio_source, conn1, events=handler.required_events(), **tracker_kwargs)
+        for follower in followers:
+            tracker.add_follower(follower)
         logging.info("Starting tracker")
         tracker.start()
         logging.info("Starting handler")
@@ -0,0 +1,243 @@
+import hashlib
+import json
+import logging
+import os
+import shutil
+import time
+
+import numpy
+
+
+DEFAULT_CACHE_DIR = os.path.join(
+    os.environ.get("XDG_CACHE_HOME", os.path.join(os.path.expanduser("~"), ".cache")),
+    "beatviewer"
+)
+DEFAULT_MAX_SIZE = 2 ** 30
+HASH_CHUNK_SIZE = 2 ** 20
+HASHES_FILENAME = "hashes.json"
+TEMP_PREFIX = ".tmp-"
+# Age, in seconds, after which staging files are considered abandoned
+STALE_TEMP_AGE = 3600
+
+
+def is_process_alive(pid):
+    """Return whether a process with the given pid exists. Outside of POSIX
+    systems, where signal 0 is not available, processes are assumed alive.
+    """
+    if os.name != "posix":
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        pass
+    return True
+
+
+class AnalysisCache:
+    """Persistent cache of analysis results, stored in `path`. Each entry is
+    a directory holding NumPy arrays, which are loaded as read-only memory
+    maps, and a JSON metadata file. Entries are keyed by a stage name, a hash
+    of the audio file content, and a dictionary of the parameters the stage
+    depends on, so that a stage is reused as long as its own parameters do
+    not change. Once the cache grows beyond `max_size` bytes, the least
+    recently used entries are evicted. Content hashes are memoized in the
+    cache directory, by path, size and modification time, so that files are
+    not read again by later processes.
+    """
+
+    def __init__(self, path=DEFAULT_CACHE_DIR, max_size=DEFAULT_MAX_SIZE):
+        self.path = path
+        self.max_size = max_size
+        self.hashes = None
+
+    def load_hashes(self):
+        """Read the memoized content hashes, as a dictionary mapping absolute
+        paths to (size, modification time, hash) lists.
+        """
+        try:
+            with open(os.path.join(self.path, HASHES_FILENAME), "r", encoding="utf8") as file:
+                return json.load(file)
+        except (OSError, ValueError):
+            return {}
+
+    def save_hashes(self):
+        """Write the memoized content hashes, merged with those written by
+        other processes in the meantime, and dropping files that changed or
+        no longer exist.
+        """
+        hashes = {**self.load_hashes(), **self.hashes}
+        for path, (size, mtime, _) in list(hashes.items()):
+            try:
+                stat = os.stat(path)
+            except OSError:
+                del hashes[path]
+                continue
+            if (stat.st_size, stat.st_mtime_ns) != (size, mtime):
+                del hashes[path]
+        os.makedirs(self.path, exist_ok=True)
+        temp_path = os.path.join(self.path, f"{TEMP_PREFIX}{os.getpid()}-{HASHES_FILENAME}")
+        with open(temp_path, "w", encoding="utf8") as file:
+            json.dump(hashes, file)
+        os.replace(temp_path, os.path.join(self.path, HASHES_FILENAME))
+        self.hashes = hashes
+
+    def hash_source(self, path):
+        """Return the SHA-1 hex digest of the content of a file. Digests are
+        memoized for as long as the file size and modification time do not
+        change.
+        """
+        if self.hashes is None:
+            self.hashes = self.load_hashes()
+        path = os.path.abspath(path)
+        stat = os.stat(path)
+        memo = self.hashes.get(path)
+        if memo is not None and memo[:2] == [stat.st_size, stat.st_mtime_ns]:
+            return memo[2]
+        digest = hashlib.sha1()
+        with open(path, "rb") as file:
+            for chunk in iter(lambda: file.read(HASH_CHUNK_SIZE), b""):
+                digest.update(chunk)
+        self.hashes[path] = [stat.st_size, stat.st_mtime_ns, digest.hexdigest()]
+        self.save_hashes()
+        return self.hashes[path][2]
+
+    def entry_path(self, stage, source_hash, params):
+        key = hashlib.sha1(json.dumps({
+            "stage": stage,
+            "source": source_hash,
+            "params": params,
+        }, sort_keys=True).encode()).hexdigest()
+        return os.path.join(self.path, f"{stage}-{key}")
+
+    def load(self, stage, source_hash, params):
+        """Return the arrays and the metadata of an entry, as a tuple, or None
+        if the entry is not cached. Loading an entry marks it as recently
+        used.
+        """
+        entry_path = self.entry_path(stage, source_hash, params)
+        try:
+            with open(os.path.join(entry_path, "meta.json"), "r", encoding="utf8") as file:
+                meta = json.load(file)
+            arrays = {}
+            for name in meta["arrays"]:
+                array_path = os.path.join(entry_path, name + ".npy")
+                try:
+                    arrays[name] = numpy.load(array_path, mmap_mode="r")
+                except ValueError:
+                    # Empty arrays can not be memory mapped
+                    arrays[name] = numpy.load(array_path)
+            os.utime(entry_path)
+        except (OSError, ValueError, KeyError):
+            logging.info("Analysis cache miss for %s", os.path.basename(entry_path))
+            return None
+        logging.info("Analysis cache hit for %s", os.path.basename(entry_path))
+        return arrays, meta
+
+    def store(self, stage, source_hash, params, arrays, meta=None):
+        """Write an entry, then evict old entries if the cache is too large.
+        The entry is written to a temporary directory first, and then renamed,
+        so that concurrent processes never read partial entries.
+        """
+        entry_path = self.entry_path(stage, source_hash, params)
+        meta = {
+            **(meta or {}),
+            "stage": stage,
+            "source": source_hash,
+            "params": params,
+            "arrays": list(arrays),
+            "created": time.time(),
+        }
+        os.makedirs(self.path, exist_ok=True)
+        temp_path = os.path.join(self.path, f"{TEMP_PREFIX}{os.getpid()}-{os.path.basename(entry_path)}")
+        os.makedirs(temp_path, exist_ok=True)
+        for name, array in arrays.items():
+            numpy.save(os.path.join(temp_path, name + ".npy"), array)
+        with open(os.path.join(temp_path, "meta.json"), "w", encoding="utf8") as file:
+            json.dump(meta, file)
+        try:
+            os.rename(temp_path, entry_path)
+            logging.info("Stored %s in analysis cache", os.path.basename(entry_path))
+        except OSError:
+            # Another process stored the same entry in the meantime
+            shutil.rmtree(temp_path, ignore_errors=True)
+        self.evict()
+
+    def entries(self):
+        """Return the list of cached entries, as dictionaries with their path,
+        size in bytes, last access time and metadata, from the least to the
+        most recently used.
+        """
+        if not os.path.isdir(self.path):
+            return []
+        entries = []
+        for name in os.listdir(self.path):
+            entry_path = os.path.join(self.path, name)
+            if name.startswith(".") or not os.path.isdir(entry_path):
+                continue
+            try:
+                with open(os.path.join(entry_path, "meta.json"), "r", encoding="utf8") as file:
+                    meta = json.load(file)
+                size = sum(entry.stat().st_size for entry in os.scandir(entry_path))
+                accessed = os.stat(entry_path).st_mtime
+            except (OSError, ValueError):
+                continue
+            entries.append({"path": entry_path, "size": size, "accessed": accessed, "meta": meta})
+        entries.sort(key=lambda entry: entry["accessed"])
+        return entries
+
+    def remove_stale_temps(self, max_age=STALE_TEMP_AGE):
+        """Remove the staging files and directories left by interrupted
+        writes, that is, those whose process is no longer running or that are
+        older than `max_age` seconds.
+        """
+        if not os.path.isdir(self.path):
+            return
+        now = time.time()
+        for name in os.listdir(self.path):
+            if not name.startswith(TEMP_PREFIX):
+                continue
+            temp_path = os.path.join(self.path, name)
+            pid = name[len(TEMP_PREFIX):].split("-", 1)[0]
+            try:
+                abandoned = pid.isdigit() and int(pid) != os.getpid() and not is_process_alive(int(pid))
+                if not abandoned and now - os.stat(temp_path).st_mtime <= max_age:
+                    continue
+            except OSError:
+                continue
+            logging.info("Removing stale %s from analysis cache", name)
+            if os.path.isdir(temp_path):
+                shutil.rmtree(temp_path, ignore_errors=True)
+            elif os.path.exists(temp_path):
+                os.remove(temp_path)
+
+    def evict(self, max_size=None):
+        """Remove the least recently used entries until the cache size is at
+        most `max_size` bytes (by default, the cache `max_size`), along with
+        stale staging directories. Return the number of removed entries.
+        """
+        if max_size is None:
+            max_size = self.max_size
+        self.remove_stale_temps()
+        entries = self.entries()
+        total_size = sum(entry["size"] for entry in entries)
+        removed = 0
+        for entry in entries:
+            if total_size <= max_size:
+                break
+            logging.info("Evicting %s from analysis cache", os.path.basename(entry["path"]))
+            shutil.rmtree(entry["path"], ignore_errors=True)
+            total_size -= entry["size"]
+            removed += 1
+        return removed
+
+    def clear(self):
+        """Remove all entries and memoized hashes. Return the number of
+        removed entries.
+        """
+        removed = self.evict(0)
+        if os.path.isfile(os.path.join(self.path, HASHES_FILENAME)):
+            os.remove(os.path.join(self.path, HASHES_FILENAME))
+        self.hashes = None
+        return removed
@@ -1,45 +1,126 @@
 import logging
-import wave
+import math
+
+import numpy
+
+from .record_writer import RecordWriter
+from .resampler import Resampler
+
+
+def get_pipeline_dtype(config, live):
+    """Resolve config.pipeline_dtype into a NumPy floating point type. In auto
+    mode, live sources use float32 and other sources use float64.
+    """
+    if config.pipeline_dtype == "auto":
+        return numpy.dtype("float32" if live else "float64")
+    return numpy.dtype(config.pipeline_dtype)
 
 
 class AudioSource:
     """Interface for audio source signal. It wraps utilities for updating an
-    array of audio samples and recording them to a local file.
+    array of audio samples and recording them to a local file. Recording is
+    performed by a background thread. If config.analysis_sampling_rate is set,
+    samples are resampled to that rate before reaching the window, and are
+    recorded at that rate. Samples are delivered as the pipeline floating point
+    type, see `get_pipeline_dtype`.
     """
 
+    live = False
+    offline = False
+
     def __init__(self, config, sampling_rate, record_path=None):
         logging.info(
             "Creating audio source, with sampling rate %d Hz",
             sampling_rate
         )
         self.config = config
+        self.dtype = get_pipeline_dtype(config, self.live)
         self.sampling_rate = sampling_rate
+        self.analysis_sampling_rate = sampling_rate
+        if self.config.analysis_sampling_rate > 0:
+            self.analysis_sampling_rate = self.config.analysis_sampling_rate
+        self.resampler = None
         self.record_path = record_path
-        self.record_file = None
+        self.record_writer = None
         self.active = True
 
     def setup(self):
         logging.info("Setting up audio source")
+        if self.analysis_sampling_rate != self.sampling_rate:
+            logging.info(
+                "Resampling audio source from %d Hz to %d Hz",
+                self.sampling_rate,
+                self.analysis_sampling_rate
+            )
+            self.resampler = Resampler(self.sampling_rate, self.analysis_sampling_rate)
         if self.record_path is not None:
-            self.record_file = wave.open(self.record_path, "wb")
-            self.record_file.setnchannels(1)
-            self.record_file.setsampwidth(2)
-            self.record_file.setframerate(self.sampling_rate)
+            self.record_writer = RecordWriter(self.record_path, self.analysis_sampling_rate)
+            self.record_writer.start()
+
+    @property
+    def backlog(self):
+        """Number of hops available but not consumed yet, for sources that
+        capture audio asynchronously.
+        """
+        return 0
 
     def _update_window(self, window):
         raise NotImplementedError
+
+    def _read_hops(self, count):
+        raise NotImplementedError
     
     def update_window(self, window):
         logging.debug("Updating audio source window")
-        self._update_window(window)
-        if self.record_file is not None:
-            i = self.config.audio_window_size - self.config.audio_hop_size
-            self.record_file.writeframes(window[i:].astype("<h").tobytes())
+        if self.resampler is None:
+            self._update_window(window)
+        else:
+            hop_size = self.config.audio_hop_size
+            while self.active and self.resampler.available < hop_size:
+                self._update_window(self.resampler)
+            if self.resampler.available > 0:
+                window.push(self._pop_resampled_hops(1)[0])
+                # As without resampling, the source only becomes inactive
+                # once an update finds no samples left
+                self.active = True
+        if self.record_writer is not None and self.active:
+            self.record_writer.write(window.latest(self.config.audio_hop_size))
+
+    def read_hops(self, count):
+        """Return up to `count` next hops as an array of shape
+        (count, audio_hop_size), for consumers processing hops in batches.
+        """
+        logging.debug("Reading %d hops from audio source", count)
+        if self.resampler is None:
+            hops = self._read_hops(count)
+        else:
+            needed = count * self.config.audio_hop_size
+            while self.resampler.available < needed:
+                missing = (needed - self.resampler.available) * self.sampling_rate / self.analysis_sampling_rate
+                source_hops = self._read_hops(math.ceil(missing / self.config.audio_hop_size))
+                if len(source_hops) == 0:
+                    break
+                self.resampler.push(source_hops.reshape(-1))
+            hops = self._pop_resampled_hops(count)
+        if self.record_writer is not None:
+            self.record_writer.write(hops)
+        return hops
     
+    def _pop_resampled_hops(self, count):
+        """Pop up to `count` hops of resampled samples, the last one being
+        padded with zeros.
+        """
+        samples = self.resampler.pop(count * self.config.audio_hop_size)
+        hops = numpy.zeros((math.ceil(len(samples) / self.config.audio_hop_size), self.config.audio_hop_size), dtype=self.dtype)
+        hops.reshape(-1)[:len(samples)] = samples
+        return hops
+
     def close(self):
         logging.info("Closing audio source")
-        if self.record_path is not None:
-            self.record_file.close()
+        if self.record_writer is not None:
+            self.record_writer.close()
+            self.record_writer = None
     
     def rewind(self):
-        pass
\ No newline at end of file
+        if self.resampler is not None:
+            self.resampler.reset()
\ No newline at end of file
@@ -0,0 +1,13 @@
+from ..ring_buffer import RingBuffer
+
+
+class AudioWindow(RingBuffer):
+    """Ring buffer holding the last `size` audio samples, which the FFT reads
+    as one contiguous view.
+    """
+
+    @property
+    def samples(self):
+        """Contiguous view of the window, from the oldest to the newest sample.
+        """
+        return self.values
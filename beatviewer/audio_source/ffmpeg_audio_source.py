@@ -0,0 +1,123 @@
+import json
+import logging
+import subprocess
+import tempfile
+
+import numpy
+
+from .file_audio_source import FileAudioSource
+
+
+def probe_audio_stream(path):
+    """Return the sampling rate and the duration (in seconds) of the first
+    audio stream of a media file, using ffprobe. Raise a ValueError if the
+    file has no audio stream, or if its duration is unknown.
+    """
+    output = subprocess.run([
+        "ffprobe",
+        "-v", "error",
+        "-select_streams", "a:0",
+        "-show_entries", "stream=sample_rate:format=duration",
+        "-of", "json",
+        path
+    ], capture_output=True, check=True).stdout
+    info = json.loads(output)
+    if not info.get("streams"):
+        raise ValueError(f"No audio stream found in '{path}'")
+    try:
+        duration = float(info["format"]["duration"])
+    except (KeyError, TypeError, ValueError):
+        # ffprobe reports "N/A" for streams it can not measure
+        raise ValueError(f"Unknown duration of '{path}'") from None
+    return int(info["streams"][0]["sample_rate"]), duration
+
+
+class FFmpegAudioSource(FileAudioSource):
+    """Decode audio frames from any media file FFmpeg can read (MP3, FLAC,
+    video containers, etc.). Decoded samples are streamed as mono int16 PCM
+    through a pipe from an ffmpeg subprocess, optionally resampled to
+    `sampling_rate`. The file length is estimated from its duration, and is
+    only used for the progress bar. The decoder is started on the first read.
+    If it fails before the end of the file, reading raises a RuntimeError,
+    instead of analyzing a truncated track.
+    """
+
+    def __init__(self, config, path, realtime=False, record_path=None,
+                 pbar_kwargs=None, sampling_rate=None):
+        self.target_sampling_rate = sampling_rate
+        self.process = None
+        self.errors = None
+        FileAudioSource.__init__(
+            self,
+            config,
+            path,
+            realtime=realtime,
+            record_path=record_path,
+            pbar_kwargs=pbar_kwargs,
+            streaming=True
+        )
+
+    def load(self):
+        sr, duration = probe_audio_stream(self.path)
+        if self.target_sampling_rate is not None:
+            sr = self.target_sampling_rate
+        self.length = round(duration * sr)
+        return sr
+
+    def open(self):
+        pass
+
+    def start_decoder(self):
+        logging.info("Starting ffmpeg decoder for '%s'", self.path)
+        # Error messages go to a file, as a pipe that is not drained could
+        # fill up and block the decoder
+        self.errors = tempfile.TemporaryFile()
+        self.process = subprocess.Popen([
+            "ffmpeg",
+            "-hide_banner",
+            "-loglevel", "error",
+            "-i", self.path,
+            "-vn",
+            "-ac", "1",
+            "-ar", f"{self.sampling_rate}",
+            "-f", "s16le",
+            "-acodec", "pcm_s16le",
+            "-"
+        ], stdout=subprocess.PIPE, stderr=self.errors)
+
+    def terminate(self):
+        if self.process is None:
+            return
+        self.process.kill()
+        self.process.wait()
+        self.process.stdout.close()
+        self.process = None
+        self.errors.close()
+        self.errors = None
+
+    def check_decoder(self):
+        """Wait for the decoder to exit, once its output is exhausted, and
+        raise a RuntimeError if it failed.
+        """
+        if self.process.wait() != 0:
+            self.errors.seek(0)
+            message = self.errors.read().decode(errors="replace").strip()
+            raise RuntimeError(f"ffmpeg failed to decode '{self.path}' (exit status {self.process.returncode}): {message}")
+
+    def _read_samples(self, out):
+        if self.process is None:
+            self.start_decoder()
+        raw = self.process.stdout.read(2 * out.size)
+        if len(raw) < 2 * out.size:
+            self.check_decoder()
+        n = len(raw) // 2
+        out[:n] = numpy.frombuffer(raw, dtype="<h", count=n)
+        return n
+
+    def close(self):
+        FileAudioSource.close(self)
+        self.terminate()
+
+    def rewind(self):
+        FileAudioSource.rewind(self)
+        self.terminate()
@@ -1,4 +1,5 @@
 import logging
+import math
 import time
 
 import numpy
@@ -8,43 +9,94 @@ import tqdm
 from .audio_source import AudioSource
 
 
+def downmix(data, dtype="float64"):
+    """Average the channels of an int16 array of shape (frames, channels).
+    Mono signals are returned as int16, others as `dtype`.
+    """
+    if data.shape[1] == 1:
+        return data[:, 0]
+    return numpy.sum(data, axis=1, dtype="int32").astype(dtype) / data.shape[1]
+
+
 class FileAudioSource(AudioSource):
     """Load audio frames from a local file. A progress bar indicates the
     progression within the file. Only support int16 WAVE files. Multichannel
-    signals are averaged to a mono signal. 
+    signals are averaged to a mono signal. In streaming mode, the file is read
+    block by block instead of being loaded in memory at once, so that memory
+    usage does not depend on the file length.
     """
 
     def __init__(self, config, path, realtime=False, record_path=None,
-                 pbar_kwargs=None):
+                 pbar_kwargs=None, streaming=False):
         logging.info(
-            "Creating file audio source from '%s', realtime is %s",
+            "Creating file audio source from '%s', realtime is %s, streaming is %s",
             path,
-            realtime
+            realtime,
+            streaming
         )
         self.path = path
         self.realtime = realtime
-        data, sr = soundfile.read(self.path, dtype="int16", start=0)
+        self.streaming = streaming
+        self.file = None
+        self.data = None
+        self.length = None
+        sr = self.load()
         AudioSource.__init__(self, config, int(sr), record_path=record_path)
-        if data.shape[1] == 1:
-            self.data = data
-        else:
-            self.data = numpy.sum(data.astype("int32"), axis=1) / data.shape[1]
         self.i = 0
         self.last_window_update = 0
         self.window_update_period = self.config.audio_hop_size / sr
         self.pbar = None
         self.pbar_kwargs = {} if pbar_kwargs is None else pbar_kwargs
-        self.length = len(self.data)
+        self.hop = numpy.zeros(self.config.audio_hop_size, dtype=self.dtype)
+
+    @property
+    def offline(self):
+        """Whether the whole file can be analyzed at once, instead of hop by
+        hop, which is the case unless it is played in realtime.
+        """
+        return not self.realtime
+
+    @staticmethod
+    def is_supported(path):
+        """Tell whether the file can be decoded by soundfile.
+        """
+        try:
+            soundfile.info(path)
+        except RuntimeError:
+            return False
+        return True
+
+    def load(self):
+        """Read the file length (in samples) and return its sampling rate.
+        Samples are read when the source is opened.
+        """
+        info = soundfile.info(self.path)
+        self.length = info.frames
+        return info.samplerate
     
     def setup(self):
         AudioSource.setup(self)
+        self.open()
         self.pbar = tqdm.tqdm(
-            total=len(self.data),
+            total=self.length,
             unit="sample",
             unit_scale=True,
             **self.pbar_kwargs
         )
 
+    def open(self):
+        """Open the file in streaming mode. Otherwise, the whole signal is
+        loaded in memory on the first read, so that sources whose analysis is
+        cached are never decoded.
+        """
+        if self.streaming:
+            self.file = soundfile.SoundFile(self.path)
+
+    def decode(self):
+        data, _ = soundfile.read(self.path, dtype="int16", start=0, always_2d=True)
+        self.data = downmix(data, self.dtype)
+        self.length = len(self.data)
+
     def _update_window(self, window):
         if self.realtime:
             while True:
@@ -53,23 +105,56 @@ class FileAudioSource(AudioSource):
                     self.last_window_update = now
                     break
                 pass
-        if self.i >= self.data.shape[0]:
+        if self._read(self.hop) == 0:
             self.active = False
             logging.info("Reached end of audio file source")
             return
-        k = self.config.audio_window_size - self.config.audio_hop_size
-        window[:k] = window[self.config.audio_hop_size:]
-        for j in range(self.config.audio_hop_size):
-            if self.i >= self.data.shape[0]:
-                window[k + j] = 0
-            else:
-                window[k + j] = self.data[self.i]
-            self.i += 1
-        self.pbar.update(min(self.config.audio_hop_size, self.length - self.pbar.n))
+        window.push(self.hop)
+
+    def _read_samples(self, out):
+        """Write the next mono samples into the 1D array `out`, and return how
+        many were available.
+        """
+        if self.streaming:
+            block = self.file.read(out.size, dtype="int16", always_2d=True)
+            out[:block.shape[0]] = downmix(block, self.dtype)
+            return block.shape[0]
+        if self.data is None:
+            self.decode()
+        n = min(out.size, max(0, self.length - self.i))
+        out[:n] = self.data[self.i:self.i + n]
+        return n
+
+    def _read(self, out):
+        """Fill `out` with the next samples from the file, padding with zeros
+        after its end. Return the number of samples actually read.
+        """
+        flat = out.reshape(-1)
+        n = self._read_samples(flat)
+        flat[n:] = 0
+        self.i += n
+        self.pbar.update(n)
+        return n
+
+    def _read_hops(self, count):
+        """Return the next `count` hops, or fewer if the end of the file is
+        reached. The last hop is padded with zeros. This ignores the realtime
+        setting.
+        """
+        hops = numpy.empty((count, self.config.audio_hop_size), dtype=self.dtype)
+        n = self._read(hops)
+        return hops[:math.ceil(n / self.config.audio_hop_size)]
     
     def close(self):
-        self.pbar.close()
+        AudioSource.close(self)
+        if self.pbar is not None:
+            self.pbar.close()
+        if self.file is not None:
+            self.file.close()
 
     def rewind(self):
+        AudioSource.rewind(self)
         self.i = 0
+        if self.file is not None:
+            self.file.seek(0)
         self.pbar.reset()
\ No newline at end of file
@@ -0,0 +1,88 @@
+import threading
+
+import numpy
+
+
+class HopQueue:
+    """Single-producer single-consumer queue of audio hops, backed by a
+    preallocated array. The producer (typically an audio callback) never
+    blocks: when the queue is full, incoming hops are dropped and counted.
+    Each counter is only incremented by one side, so no lock is needed.
+
+    Statistics, cumulated since creation:
+    - `dropped`: hops discarded because the queue was full,
+    - `late`: hops read while a newer hop was already waiting in the queue.
+    """
+
+    def __init__(self, capacity, hop_size, dtype="int16"):
+        self.capacity = capacity
+        self.hops = numpy.zeros((capacity, hop_size), dtype=dtype)
+        # Views on each row, so that the producer never creates arrays
+        self.slots = list(self.hops)
+        self.write_count = 0
+        self.read_count = 0
+        self.dropped = 0
+        self.late = 0
+        self.event = threading.Event()
+
+    def __len__(self):
+        return self.write_count - self.read_count
+
+    def put(self, hop):
+        """Append a hop to the queue. Return False if it was dropped.
+        """
+        slot = self.next_slot()
+        if slot is None:
+            return False
+        slot[:] = hop
+        self.commit()
+        return True
+
+    def next_slot(self):
+        """Return the array where the next hop must be written in place,
+        before calling `commit`, or None if the queue is full, in which case
+        the hop is counted as dropped.
+        """
+        if len(self) >= self.capacity:
+            self.dropped += 1
+            return None
+        return self.slots[self.write_count % self.capacity]
+
+    def commit(self):
+        """Make the hop written to the slot returned by `next_slot` available
+        to the consumer.
+        """
+        self.write_count += 1
+        self.event.set()
+
+    def get(self, out, timeout=None):
+        """Copy the oldest hop into `out`, waiting at most `timeout` seconds
+        for one to be available. Return False if the queue stayed empty.
+        """
+        self.event.clear()
+        if len(self) == 0 and not self.event.wait(timeout):
+            return False
+        if len(self) > 1:
+            self.late += 1
+        out[:] = self.hops[self.read_count % self.capacity]
+        self.read_count += 1
+        return True
+
+    def get_many(self, out):
+        """Copy as many of the oldest hops as possible into the rows of `out`,
+        without waiting. Return the number of hops copied.
+        """
+        available = len(self)
+        n = min(len(out), available)
+        if n == 0:
+            return 0
+        self.late += n if available > n else n - 1
+        start = self.read_count % self.capacity
+        k = min(n, self.capacity - start)
+        out[:k] = self.hops[start:start + k]
+        out[k:n] = self.hops[:n - k]
+        self.read_count += n
+        return n
+
+    def clear(self):
+        self.read_count = self.write_count
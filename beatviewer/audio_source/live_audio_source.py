@@ -5,48 +5,122 @@ import numpy
 import sounddevice
 
 from .audio_source import AudioSource
+from .hop_queue import HopQueue
 
 
 class LiveAudioSource(AudioSource):
     """Load audio frames from an audio input device. Multichannel signals are
-    averaged to a mono signal.
+    averaged to a mono signal. If `queue_size` is positive, the device is read
+    in callback mode: the audio thread pushes each hop in a queue of that many
+    hops, and never waits for the analysis. Otherwise, hops are read with
+    blocking calls.
     """
 
-    def __init__(self, config, device_index, record_path=None):
+    live = True
+
+    def __init__(self, config, device_index, record_path=None, queue_size=0):
         logging.info(
-            "Creating live audio source for device index %d",
-            device_index
+            "Creating live audio source for device index %d, queue size is %d",
+            device_index,
+            queue_size
         )
         self.device_index = device_index
         self.device_info = sounddevice.query_devices(self.device_index, "input")
         self.channels = int(self.device_info["max_input_channels"])
         self.stream = None
+        self.queue_size = queue_size
+        self.queue = None
+        self.hop = None
+        self.mix = None
         self.overflow_ts = None
+        self.overflow_count = 0
         self.stats_overflowing = 0
         self.stats_total = 0
+        self.stats_lost = 0
         AudioSource.__init__(
             self,
-            config, 
-            int(self.device_info["default_samplerate"]), 
+            config,
+            int(self.device_info["default_samplerate"]),
             record_path=record_path
         )
 
     def setup(self):
         logging.info("Setting up live audio source")
         AudioSource.setup(self)
+        callback = None
+        if self.queue_size > 0:
+            self.queue = HopQueue(self.queue_size, self.config.audio_hop_size)
+            self.hop = numpy.zeros(self.config.audio_hop_size, dtype="int16")
+            self.mix = numpy.zeros(self.config.audio_hop_size, dtype="int32")
+            callback = self.callback
         self.stream = sounddevice.InputStream(
             device=self.device_index,
             channels=self.channels,
             samplerate=self.sampling_rate,
             blocksize=self.config.audio_hop_size,
-            dtype="int16"
+            dtype="int16",
+            callback=callback
         )
         self.stream.start()
-    
+
+    def callback(self, indata, frames, time_info, status):
+        """Audio thread callback, only used in callback mode. Channels are
+        summed into a preallocated buffer, and averaged directly into the next
+        slot of the queue, so that no array is allocated.
+        """
+        if status.input_overflow:
+            self.overflow_count += 1
+        slot = self.queue.next_slot()
+        if slot is None:
+            return
+        numpy.sum(indata, axis=1, dtype=self.mix.dtype, out=self.mix)
+        numpy.divide(self.mix, indata.shape[1], out=slot, casting="unsafe")
+        self.queue.commit()
+
+    @property
+    def lost_hops(self):
+        """Number of hops lost since the source was set up, either because
+        the device overflowed or because the queue was full.
+        """
+        if self.queue is None:
+            return self.overflow_count
+        return self.overflow_count + self.queue.dropped
+
+    @property
+    def backlog(self):
+        """Number of hops captured but not consumed yet.
+        """
+        if self.queue is None:
+            return 0
+        return len(self.queue)
+
     def _update_window(self, window):
-        data, overflowed = self.stream.read(frames=self.config.audio_hop_size)
-        if overflowed:
-            self.stats_overflowing += 1
+        if self.queue is None:
+            data, overflowed = self.stream.read(frames=self.config.audio_hop_size)
+            if overflowed:
+                self.overflow_count += 1
+            window.push((numpy.sum(data, axis=1) / data.shape[1]).astype("int16"))
+        else:
+            while not self.queue.get(self.hop, timeout=1):
+                logging.warning("Live audio source received no audio in the last second")
+            window.push(self.hop)
+        self.report_lost_hops()
+
+    def _read_hops(self, count):
+        if self.queue is None:
+            data, overflowed = self.stream.read(frames=count * self.config.audio_hop_size)
+            if overflowed:
+                self.overflow_count += 1
+            mono = (numpy.sum(data, axis=1) / data.shape[1]).astype("int16")
+            return mono.reshape(count, self.config.audio_hop_size)
+        hops = numpy.empty((count, self.config.audio_hop_size), dtype="int16")
+        return hops[:self.queue.get_many(hops)]
+
+    def report_lost_hops(self):
+        lost = self.lost_hops
+        if lost > self.stats_lost:
+            self.stats_overflowing += lost - self.stats_lost
+            self.stats_lost = lost
             if self.overflow_ts is None:
                 self.overflow_ts = time.time()
         self.stats_total += 1
@@ -57,14 +131,17 @@ class LiveAudioSource(AudioSource):
                 self.stats_total,
                 100 * self.stats_overflowing / self.stats_total
             )
+            if self.queue is not None:
+                logging.warning(
+                    "Audio queue has dropped %d hops and delivered %d late hops so far",
+                    self.queue.dropped,
+                    self.queue.late
+                )
             self.overflow_ts = None
             self.stats_total = 0
             self.stats_overflowing = 0
-        n = self.config.audio_window_size - self.config.audio_hop_size
-        window[:n] = window[self.config.audio_hop_size:]
-        window[n:] = (numpy.sum(data, axis=1) / data.shape[1]).astype("int16")
-    
+
     def close(self):
         logging.info("Closing live audio source")
         AudioSource.close(self)
-        self.stream.abort()
\ No newline at end of file
+        self.stream.abort()
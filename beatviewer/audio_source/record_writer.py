@@ -0,0 +1,95 @@
+import logging
+import queue
+import threading
+import wave
+
+
+# Seconds between checks that the writer thread is alive, while waiting for
+# room in a full buffer
+WRITER_POLL_TIMEOUT = 1
+
+
+class RecordWriter(threading.Thread):
+    """Background thread writing recorded audio to a mono int16 WAVE file.
+    Blocks of samples are passed through a bounded buffer, and all blocks
+    available at once are written in a single call, so that slow disks do not
+    stall the analysis loop. If the buffer is full, the caller waits for the
+    writer, so that the recording stays complete. The file is opened by the
+    caller, so that errors surface at setup. If the writer thread fails,
+    writing raises instead of waiting for it.
+    """
+
+    def __init__(self, path, sampling_rate, buffer_size=1024):
+        threading.Thread.__init__(self, daemon=True)
+        self.path = path
+        self.sampling_rate = sampling_rate
+        self.buffer_size = buffer_size
+        self.buffer = queue.Queue(maxsize=buffer_size)
+        self.high_water_mark = 0
+        self.stalls = 0
+        self.error = None
+        self.file = wave.open(self.path, "wb")
+        self.file.setnchannels(1)
+        self.file.setsampwidth(2)
+        self.file.setframerate(self.sampling_rate)
+
+    def run(self):
+        try:
+            running = True
+            while running:
+                blocks = [self.buffer.get()]
+                while not self.buffer.empty():
+                    blocks.append(self.buffer.get_nowait())
+                if blocks[-1] is None:
+                    running = False
+                    blocks.pop()
+                self.file.writeframes(b"".join(blocks))
+        except Exception as err:
+            logging.exception("Recording writer failed")
+            self.error = err
+        finally:
+            self.file.close()
+
+    def put(self, block):
+        """Enqueue a block, waiting while the buffer is full. Raise a
+        RuntimeError if the writer thread is not running.
+        """
+        while True:
+            if not self.is_alive():
+                raise RuntimeError(f"Recording writer for '{self.path}' is not running") from self.error
+            try:
+                self.buffer.put(block, timeout=WRITER_POLL_TIMEOUT)
+                return
+            except queue.Full:
+                pass
+
+    def write(self, samples):
+        """Enqueue an array of samples to be written.
+        """
+        block = samples.astype("<h").tobytes()
+        if not self.is_alive():
+            raise RuntimeError(f"Recording writer for '{self.path}' is not running") from self.error
+        try:
+            self.buffer.put_nowait(block)
+        except queue.Full:
+            self.stalls += 1
+            logging.warning("Recording buffer is full, waiting for the disk")
+            self.put(block)
+        self.high_water_mark = max(self.high_water_mark, self.buffer.qsize())
+
+    def close(self):
+        """Write the remaining blocks, close the file and wait for the thread
+        to finish. If the writer thread already stopped, only wait for it.
+        """
+        if self.is_alive():
+            try:
+                self.put(None)
+            except RuntimeError:
+                pass
+            self.join()
+        logging.info(
+            "Recording buffer high-water mark: %d blocks of %d, %d stalls",
+            self.high_water_mark,
+            self.buffer_size,
+            self.stalls
+        )
@@ -0,0 +1,66 @@
+import math
+
+import numpy
+import scipy.signal
+
+
+class Resampler:
+    """Streaming polyphase resampler, converting a signal from `input_rate` to
+    `output_rate` by a rational factor L/M. The anti-aliasing lowpass filter
+    is the same as the one used by scipy.signal.resample_poly, and is split
+    into L phases, so that only the output samples are computed. Samples are
+    pushed in chunks of any size, and resampled samples accumulate until they
+    are popped. The filter is centered, which delays the output by half the
+    filter length.
+    """
+
+    def __init__(self, input_rate, output_rate):
+        g = math.gcd(input_rate, output_rate)
+        self.up = output_rate // g
+        self.down = input_rate // g
+        max_rate = max(self.up, self.down)
+        self.delay = 10 * max_rate
+        taps = self.up * scipy.signal.firwin(2 * self.delay + 1, 1 / max_rate, window=("kaiser", 5.0))
+        self.phase_size = math.ceil(len(taps) / self.up)
+        padded = numpy.zeros(self.phase_size * self.up)
+        padded[:len(taps)] = taps
+        self.phases = padded.reshape(self.phase_size, self.up).T
+        self.history = None
+        self.input_count = 0
+        self.output_count = 0
+        self.pending = None
+        self.reset()
+
+    @property
+    def available(self):
+        return len(self.pending)
+
+    def reset(self):
+        self.history = numpy.zeros(self.phase_size)
+        self.input_count = 0
+        self.output_count = 0
+        self.pending = numpy.zeros(0)
+
+    def push(self, samples):
+        """Resample a chunk of input samples, and append the output samples
+        that can be computed to the pending samples.
+        """
+        buffer = numpy.concatenate([self.history, samples])
+        start = self.input_count - self.phase_size
+        self.input_count += len(samples)
+        last = (self.input_count * self.up - 1 - self.delay) // self.down
+        m = numpy.arange(self.output_count, last + 1)
+        position = m * self.down + self.delay
+        n = position // self.up - start
+        gathered = buffer[n[:, numpy.newaxis] - numpy.arange(self.phase_size)]
+        output = numpy.einsum("ij,ij->i", self.phases[position % self.up], gathered)
+        self.pending = numpy.concatenate([self.pending, output])
+        self.output_count = last + 1
+        self.history = buffer[-self.phase_size:]
+
+    def pop(self, n):
+        """Remove and return up to `n` of the oldest pending samples.
+        """
+        samples = self.pending[:n]
+        self.pending = self.pending[n:]
+        return samples
@@ -1,6 +1,7 @@
 import logging
 import multiprocessing
 
+from .beat_tracker import EventFlag
 from .beat_tracker_process import BeatTrackerProcess
 
 
@@ -26,6 +27,12 @@ class BeatHandlerProcess(multiprocessing.Process):
     def from_keys(cls, pipe, args, args_keys, kwargs_keys):
         return cls(pipe, *[getattr(args, key) for key in args_keys], **{key: getattr(args, key) for key in kwargs_keys})
     
+    def required_events(self):
+        """Return the set of EventFlag this handler reacts to, so that the
+        tracker can skip the stages computing the others.
+        """
+        return {EventFlag.ONSET, EventFlag.BEAT, EventFlag.BPM}
+
     def setup(self):
         logging.info("Setting up beat handler")
     
@@ -5,9 +5,12 @@ import logging
 import math
 
 import keyboard
+import numpy
 
 from .graph import Graph
+from .pipelines.offline_beat_tracking import detect_onsets, track_beats
 from .pipelines.pipeline import Pipeline
+from .pipelines.tempo_estimation_pipeline import TempoEstimationPipepline
 
 
 @enum.unique
@@ -46,6 +49,25 @@ class BeatTrackingEvent:
 
 
 class BeatTracker(Pipeline):
+    """Run the pipeline and dispatch its events to callbacks. If `events` is
+    a collection of EventFlag, only those events are handled, and pipeline
+    stages that only feed other events are skipped. All events are handled
+    when the graph is shown or when events are registered.
+
+    With the "offline" engine, which requires an offline audio source, events
+    are computed over the whole source at once, using global information:
+    tempo is estimated on every OSS window and beats are placed by dynamic
+    programming. Events are registered, but callbacks are not called, and no
+    warmup is needed.
+
+    If an `analysis_cache` is given (see AnalysisCache) and the source is
+    offline, intermediate results are cached, and so are registered events
+    when nothing else depends on the analysis (no callback, graph, keyboard
+    event or follower).
+    """
+
+    ENGINE_CAUSAL = "causal"
+    ENGINE_OFFLINE = "offline"
 
     def __init__(
         self,
@@ -61,9 +83,28 @@ class BeatTracker(Pipeline):
         output_path=None,
         register_events: bool = False,
         warmup: bool = False,
+        events=None,
+        engine: str = ENGINE_CAUSAL,
+        analysis_cache=None,
     ):
         logging.info("Creating beat tracker")
-        Pipeline.__init__(self, config, audio_source)
+        register_events = register_events or (output_path is not None)
+        if events is None or show_graph or register_events:
+            self.required_events = set(EventFlag)
+        else:
+            self.required_events = set(events)
+        logging.info(
+            "Required events: %s",
+            ", ".join(EventFlag.to_string(flag) for flag in sorted(self.required_events, key=lambda flag: flag.value))
+        )
+        Pipeline.__init__(
+            self,
+            config,
+            audio_source,
+            track_beats=EventFlag.BEAT in self.required_events,
+            estimate_tempo=bool({EventFlag.BEAT, EventFlag.BPM} & self.required_events),
+            analysis_cache=analysis_cache
+        )
         self.onset_callback = onset_callback
         self.beat_callback = beat_callback
         self.bpm_callback = bpm_callback
@@ -73,11 +114,11 @@ class BeatTracker(Pipeline):
         self.graph_fps = graph_fps
         self.graph_interval = 1
         self.keybord_events = keyboard_events
-        self.sampling_rate = None
         self.sampling_rate_oss = None
         self.output_path = output_path
-        self.register_events = register_events or (self.output_path is not None)
+        self.register_events = register_events
         self.warmup: bool = warmup
+        self.engine: str = engine
         self.rewound: bool = False
         self.events: list[BeatTrackingEvent] = []
     
@@ -94,15 +135,18 @@ class BeatTracker(Pipeline):
     def setup(self):
         logging.info("Setting up beat tracker")
         Pipeline.setup(self)
-        self.sampling_rate = self.audio_source.sampling_rate
+        self.sampling_rate = self.audio_source.analysis_sampling_rate
         self.sampling_rate_oss = self.sampling_rate / self.config.audio_hop_size
         self.graph_interval = math.ceil(self.sampling_rate_oss / self.graph_fps)
+        if self.warmup and self.leader is None:
+            self.record_history()
         if self.show_graph:
             self.graph = Graph(self, self.graph_size)
             self.graph.start()
 
     def close(self):
         logging.info("Closing beat tracker")
+        Pipeline.close(self)
         if self.show_graph:
             self.graph.terminate()
         if self.output_path is not None:
@@ -133,11 +177,19 @@ class BeatTracker(Pipeline):
     def update(self):
         logging.debug("Updating beat tracker")
         Pipeline.update(self)
-        if self.onset_flag:
+        self.handle_events()
+
+    def follow(self, fluxes, oss_values=None):
+        Pipeline.follow(self, fluxes, oss_values)
+        if self.leader is not None:
+            self.handle_events()
+
+    def handle_events(self):
+        if self.onset_flag and EventFlag.ONSET in self.required_events:
             self.handle_onset()
         if self.beat_flag:
             self.handle_beat()
-        if self.bpm_flag:
+        if self.bpm_flag and EventFlag.BPM in self.required_events:
             self.handle_bpm()
         if self.graph is not None and self.frame_index % self.graph_interval == 0:
             self.graph.update()
@@ -162,9 +214,109 @@ class BeatTracker(Pipeline):
         self.events = []
         self.rewound = True
     
+    def run_offline(self):
+        """Compute all events at once, from the offline OSS series. Gated
+        frames are left out. Each tempo estimate applies from the center of
+        its OSS window, and the first one also applies before, so there is no
+        tempo hunting at the start. Beats are moved back by the delay of the
+        hamming window smoothing the OSS.
+        """
+        if self.offline_oss is None:
+            raise ValueError("The offline engine requires an offline audio source")
+        logging.info("Running offline beat tracking")
+        frames = numpy.flatnonzero(~self.offline_gated)
+        oss = self.offline_oss[frames]
+        window_size = self.config.oss_window_size
+        centers = []
+        tempo_lags = []
+        padded = numpy.concatenate([numpy.zeros(max(0, window_size - len(oss)), dtype=oss.dtype), oss])
+        for end in range(window_size, len(padded) + 1, self.config.oss_hop_size):
+            scaled_tempo_lag, _ = TempoEstimationPipepline.update(self, padded[end - window_size:end])
+            if scaled_tempo_lag is not None:
+                centers.append(end - window_size // 2 - (len(padded) - len(oss)))
+                tempo_lags.append(int(scaled_tempo_lag))
+        if len(tempo_lags) == 0:
+            centers, tempo_lags = [0], [self.tempo_lag]
+        estimate_index = numpy.maximum(0, numpy.searchsorted(centers, numpy.arange(len(oss)), side="right") - 1)
+        frame_tempo_lags = numpy.array(tempo_lags)[estimate_index]
+        self.events = []
+        for i in detect_onsets(oss, self.config):
+            self.events.append(BeatTrackingEvent(EventFlag.ONSET, int(frames[i]), frames[i] / self.sampling_rate_oss, None))
+        delay = (self.config.hamming_window_size - 1) // 2
+        for i in track_beats(oss, frame_tempo_lags, self.config.dp_tightness):
+            frame = int(frames[max(0, i - delay)])
+            self.events.append(BeatTrackingEvent(EventFlag.BEAT, frame, frame / self.sampling_rate_oss, None))
+        if len(oss) > 0:
+            for i in numpy.flatnonzero(numpy.diff(frame_tempo_lags, prepend=0) != 0):
+                self.tempo_lag = int(frame_tempo_lags[i])
+                self.events.append(BeatTrackingEvent(EventFlag.BPM, int(frames[i]), frames[i] / self.sampling_rate_oss, self.bpm))
+        self.events.sort(key=lambda event: (event.frame, event.flag.value))
+        self.frame_index = len(self.offline_flux) - 1
+        self.active = False
+
+    def events_cache_params(self):
+        """Return the parameters registered events depend on, as a key for
+        the analysis cache, or None if events can not be cached.
+        """
+        if self.analysis_cache is None or not self.audio_source.offline or not self.register_events\
+            or self.leader is not None or self.followers or self.show_graph or self.keybord_events\
+            or self.onset_callback is not None or self.beat_callback is not None or self.bpm_callback is not None:
+            return None
+        return {
+            **self.config.to_dict(),
+            **self.front_end_cache_params(),
+            "engine": self.engine,
+            "warmup": self.warmup,
+        }
+
+    def load_cached_events(self):
+        """Load the registered events from the analysis cache, if available.
+        Return whether they were.
+        """
+        params = self.events_cache_params()
+        if params is None:
+            return False
+        entry = self.analysis_cache.load("events", self.analysis_cache.hash_source(self.audio_source.path), params)
+        if entry is None:
+            return False
+        arrays, meta = entry
+        self.sampling_rate = self.audio_source.analysis_sampling_rate
+        self.sampling_rate_oss = self.sampling_rate / self.config.audio_hop_size
+        self.events = [
+            BeatTrackingEvent(EventFlag(int(flag)), int(frame), float(time), None if numpy.isnan(value) else float(value))
+            for flag, frame, time, value in arrays["events"]
+        ]
+        self.frame_index = meta["frame_index"]
+        self.active = False
+        return True
+
+    def store_cached_events(self):
+        params = self.events_cache_params()
+        if params is None:
+            return
+        events = numpy.array(
+            [(event.flag.value, event.frame, event.time, numpy.nan if event.value is None else event.value) for event in self.events],
+            dtype=[("flag", "i1"), ("frame", "i8"), ("time", "f8"), ("value", "f8")]
+        )
+        self.analysis_cache.store(
+            "events",
+            self.analysis_cache.hash_source(self.audio_source.path),
+            params,
+            {"events": events},
+            {"path": self.audio_source.path, "frame_index": int(self.frame_index)}
+        )
+
     def run(self):
+        if self.load_cached_events():
+            self.close()
+            return
         self.setup()
         logging.info("Done setting up beat tracker")
+        if self.engine == self.ENGINE_OFFLINE:
+            self.run_offline()
+            self.store_cached_events()
+            self.close()
+            return
         i = 0
         while self.running and self.active:
             if self.warmup and self.warmup_end is not None and self.frame_index >= self.warmup_end and not self.rewound:
@@ -178,4 +330,6 @@ class BeatTracker(Pipeline):
                 self.update()
             except KeyboardInterrupt:
                 break
+        if not self.active:
+            self.store_cached_events()
         self.close()
\ No newline at end of file
@@ -2,16 +2,21 @@ class Config:
 
     def __init__(
         self,
+        analysis_sampling_rate=0,
+        pipeline_dtype="auto",
         audio_window_size=1024,
         audio_hop_size=128,
         compression_gamma=1,
         noise_cancellation_level=-74,
         hamming_window_size=15,
+        silence_gate_level=-70,
+        silence_gate_duration=0,
         oss_buffer_size=1024,
         onset_threshold=0.1,
         onset_threshold_min=5.0,
         oss_window_size=2048,
         oss_hop_size=128,
+        oss_hop_size_max=0,
         frequency_domain_compression=.5,
         min_bpm_detection=50,
         max_bpm_detection=210,
@@ -20,6 +25,7 @@ class Config:
         tempo_accumulator_gaussian_width=10,
         min_bpm_rescaled=90,
         max_bpm_rescaled=180,
+        tempo_estimation_async=1,
         cbss_eta=300,
         cbss_alpha=0.9,
         bps_buffer_size=1024,
@@ -29,6 +35,8 @@ class Config:
         bps_gaussian_width=10,
         cbss_buffer_size=512,
         bps_cooldown_ratio=0.4,
+        catch_up_backlog=4,
+        dp_tightness=100,
         key_trigger_beats_earlier="page up",
         key_trigger_beats_later="page down",
         key_set_mode_regular="f9",
@@ -36,12 +44,18 @@ class Config:
     ):
 
         # OSS Computation
+        self.analysis_sampling_rate = analysis_sampling_rate
+        self.pipeline_dtype = pipeline_dtype
         self.audio_window_size = audio_window_size
         self.audio_hop_size = audio_hop_size
         self.compression_gamma = compression_gamma
         self.noise_cancellation_threshold = 10 ** (noise_cancellation_level / 20) * self.audio_window_size
         self.hamming_window_size = hamming_window_size
 
+        # Silence Gate
+        self.silence_gate_threshold = (10 ** (silence_gate_level / 20) * 32768) ** 2 * self.audio_window_size
+        self.silence_gate_duration = silence_gate_duration
+
         # Onset Detection
         self.oss_buffer_size = oss_buffer_size
         self.onset_threshold = onset_threshold
@@ -50,6 +64,7 @@ class Config:
         # Tempo Detection
         self.oss_window_size = oss_window_size
         self.oss_hop_size = oss_hop_size
+        self.oss_hop_size_max = max(oss_hop_size, oss_hop_size_max)
         self.frequency_domain_compression = frequency_domain_compression
         self.min_bpm_detection = min_bpm_detection
         self.max_bpm_detection = max_bpm_detection
@@ -58,6 +73,7 @@ class Config:
         self.tempo_accumulator_gaussian_width = tempo_accumulator_gaussian_width
         self.min_bpm_rescaled = min_bpm_rescaled
         self.max_bpm_rescaled = max_bpm_rescaled
+        self.tempo_estimation_async = tempo_estimation_async
 
         # CBSS Computation
         self.cbss_buffer_size = cbss_buffer_size
@@ -72,6 +88,12 @@ class Config:
         self.bps_buffer_size = bps_buffer_size
         self.bps_cooldown_ratio = bps_cooldown_ratio
 
+        # Catch-up
+        self.catch_up_backlog = catch_up_backlog
+
+        # Offline Beat Tracking
+        self.dp_tightness = dp_tightness
+
         # Keys
         self.key_trigger_beats_earlier = key_trigger_beats_earlier
         self.key_trigger_beats_later = key_trigger_beats_later
@@ -104,16 +126,21 @@ class Config:
     
     def to_dict(self):
         return {
+            "analysis_sampling_rate": self.analysis_sampling_rate,
+            "pipeline_dtype": self.pipeline_dtype,
             "audio_window_size": self.audio_window_size,
             "audio_hop_size": self.audio_hop_size,
             "compression_gamma": self.compression_gamma,
             "noise_cancellation_threshold": self.noise_cancellation_threshold,
             "hamming_window_size": self.hamming_window_size,
+            "silence_gate_threshold": self.silence_gate_threshold,
+            "silence_gate_duration": self.silence_gate_duration,
             "oss_buffer_size": self.oss_buffer_size,
             "onset_threshold": self.onset_threshold,
             "onset_threshold_min": self.onset_threshold_min,
             "oss_window_size": self.oss_window_size,
             "oss_hop_size": self.oss_hop_size,
+            "oss_hop_size_max": self.oss_hop_size_max,
             "frequency_domain_compression": self.frequency_domain_compression,
             "min_bpm_detection": self.min_bpm_detection,
             "max_bpm_detection": self.max_bpm_detection,
@@ -122,6 +149,7 @@ class Config:
             "tempo_accumulator_gaussian_width": self.tempo_accumulator_gaussian_width,
             "min_bpm_rescaled": self.min_bpm_rescaled,
             "max_bpm_rescaled": self.max_bpm_rescaled,
+            "tempo_estimation_async": self.tempo_estimation_async,
             "cbss_buffer_size": self.cbss_buffer_size,
             "cbss_eta": self.cbss_eta,
             "cbss_alpha": self.cbss_alpha,
@@ -131,4 +159,6 @@ class Config:
             "bps_gaussian_width": self.bps_gaussian_width,
             "bps_buffer_size": self.bps_buffer_size,
             "bps_cooldown_ratio": self.bps_cooldown_ratio,
+            "catch_up_backlog": self.catch_up_backlog,
+            "dp_tightness": self.dp_tightness,
         }
\ No newline at end of file
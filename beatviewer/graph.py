@@ -48,8 +48,8 @@ class Graph:
         self.plot_oss = self.axis.plot([0] * self.size, label="OSS")[0]
         self.plot_oss_mean = self.axis.plot([0, self.size - 1], [self.tracker.oss_mean, self.tracker.oss_mean], "-", label="OSS mean")[0]
         self.plot_oss_threshold = self.axis.plot([0, self.size - 1], [self.tracker.oss_threshold, self.tracker.oss_threshold], "-", label="OSS threshold")[0]
-        self.plot_cbss = self.axis.plot(self.tracker.cbss_buffer[-self.size:], label="CBSS")[0]
-        self.plot_bps = self.axis.plot(range(self.size, 2 * self.size), self.tracker.cbss_buffer[-self.size:], "--", label="BPS")[0]
+        self.plot_cbss = self.axis.plot(self.tracker.cbss_buffer.values[-self.size:], label="CBSS")[0]
+        self.plot_bps = self.axis.plot(range(self.size, 2 * self.size), self.tracker.cbss_buffer.values[-self.size:], "--", label="BPS")[0]
         self.plot_detection_length = self.axis.plot([0, 0], [0, 0], label="Δt")[0]
         self.plot_beat_trigger_index = self.axis.plot([self.size + self.tracker.config.bps_epsilon_t, self.size + self.tracker.config.bps_epsilon_t], [0, 1], label="εt")[0]
         self.text_bpm = self.axis.text(self.size, 1.03, "%.2f" % (60 * self.tracker.sampling_rate_oss / self.tracker.tempo_lag), ha="center")
@@ -59,27 +59,27 @@ class Graph:
         matplotlib.pyplot.show(block=False)
     
     def update(self):
+        oss_values = list(self.tracker.oss_buffer.latest(min(self.size, self.tracker.oss_buffer.count)))
         max_oss = .1
-        if len(self.tracker.oss_buffer[-self.size:]):
-            max_oss = max(self.tracker.oss_buffer[-self.size:])
+        if len(oss_values):
+            max_oss = max(oss_values)
         vmax_l = max(
             .1,
             max_oss,
-            max(self.tracker.cbss_buffer[-self.size:])
+            max(self.tracker.cbss_buffer.values[-self.size:])
         )
         vmax_r = max(
             .1,
-            max(self.tracker.bps_buffer[:self.size])
+            max(self.tracker.bps_buffer.values[:self.size])
         )
-        oss_values = self.tracker.oss_buffer[-self.size:]
         if len(oss_values) < self.size:
             oss_values = [0] * (self.size - len(oss_values)) + oss_values
         self.plot_oss.set_ydata(list(map(lambda y: y / vmax_l, oss_values)))
         self.plot_oss_mean.set_ydata([self.tracker.oss_mean / vmax_l, self.tracker.oss_mean / vmax_l])
         self.plot_oss_threshold.set_ydata([self.tracker.oss_threshold / vmax_l, self.tracker.oss_threshold / vmax_l])
-        self.plot_cbss.set_ydata(list(map(lambda y: y / vmax_l, self.tracker.cbss_buffer[-self.size:])))
-        self.plot_bps.set_ydata(list(map(lambda y: y / vmax_r, self.tracker.bps_buffer[:self.size])))
-        self.plot_detection_length.set_data([self.size - self.tracker.phi_max - self.tracker.tempo_lag, self.size - self.tracker.phi_max], [self.tracker.cbss_buffer[-self.tracker.phi_max] / vmax_l, self.tracker.cbss_buffer[-self.tracker.phi_max] / vmax_l])
+        self.plot_cbss.set_ydata(list(map(lambda y: y / vmax_l, self.tracker.cbss_buffer.values[-self.size:])))
+        self.plot_bps.set_ydata(list(map(lambda y: y / vmax_r, self.tracker.bps_buffer.values[:self.size])))
+        self.plot_detection_length.set_data([self.size - self.tracker.phi_max - self.tracker.tempo_lag, self.size - self.tracker.phi_max], [self.tracker.cbss_buffer.values[-self.tracker.phi_max] / vmax_l, self.tracker.cbss_buffer.values[-self.tracker.phi_max] / vmax_l])
         self.text_bpm.set_text("%.2f" % (60 * self.tracker.sampling_rate_oss / self.tracker.tempo_lag))
         self.plot_beat_trigger_index.set_xdata([self.size + self.tracker.config.bps_epsilon_t, self.size + self.tracker.config.bps_epsilon_t])
         
@@ -1,6 +1,7 @@
 import os
 
 from ..beat_handler_process import BeatHandlerProcess
+from ..beat_tracker import EventFlag
 
 try:
     import winsound
@@ -29,6 +30,13 @@ class Beep(BeatHandlerProcess):
     def from_args(cls, pipe, args):
         return cls.from_keys(pipe, args, [], ["beats_only", "onsets_only"])
 
+    def required_events(self):
+        if self.onsets_only:
+            return {EventFlag.ONSET}
+        if self.beats_only:
+            return {EventFlag.BEAT}
+        return {EventFlag.ONSET, EventFlag.BEAT}
+
     def handle_beat(self):
         if self.onsets_only:
             return
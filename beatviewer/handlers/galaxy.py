@@ -3,6 +3,7 @@ import random
 
 import pygame
 
+from ..beat_tracker import EventFlag
 from .pygame_handler import PygameHandler
 
 
@@ -230,6 +231,9 @@ class Galaxy(PygameHandler):
         for dot in self.dots:
             dot.push(self.previous_direction[:], self.dxz)
 
+    def required_events(self):
+        return {EventFlag.BEAT}
+
     def handle_beat(self):
         self.push_dots()
 
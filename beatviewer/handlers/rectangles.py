@@ -4,6 +4,7 @@ import time
 
 import pygame
 
+from ..beat_tracker import EventFlag
 from .pygame_handler import PygameHandler
 
 
@@ -105,6 +106,12 @@ class Rectangles(PygameHandler):
         self.bg_color = self.palette[self.color_index][0]
         self.fg_color = self.palette[self.color_index][1]
     
+    def required_events(self):
+        events = {EventFlag.BEAT, EventFlag.BPM}
+        if self.handle_onsets:
+            events.add(EventFlag.ONSET)
+        return events
+
     def handle_beat(self):
         self.rectangles.append((time.time(), self.beat_breadth, 1))
         self.change_color()
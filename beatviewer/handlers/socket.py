@@ -5,6 +5,7 @@ import socket
 import websockets
 
 from ..beat_handler_process import BeatHandlerProcess
+from ..beat_tracker import EventFlag
 
 
 class WebSocketServer(threading.Thread):
@@ -100,6 +101,16 @@ class Socket(BeatHandlerProcess):
             pipe, args, [],
             ["host", "port", "web", "mute_beats", "mute_onsets", "mute_bpm"])
     
+    def required_events(self):
+        events = set()
+        if not self.mute_onsets:
+            events.add(EventFlag.ONSET)
+        if not self.mute_beats:
+            events.add(EventFlag.BEAT)
+        if not self.mute_bpm:
+            events.add(EventFlag.BPM)
+        return events
+
     def handle_beat(self):
         if self.server is None or self.mute_beats:
             return
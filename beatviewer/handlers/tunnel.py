@@ -2,6 +2,7 @@ import time
 
 import pygame
 
+from ..beat_tracker import EventFlag
 from .pygame_handler import PygameHandler
 
 
@@ -41,6 +42,9 @@ class Tunnel(PygameHandler):
     def setup(self):
         PygameHandler.setup(self, "BeatViewer: Tunnel")
 
+    def required_events(self):
+        return {EventFlag.BEAT, EventFlag.BPM}
+
     def handle_beat(self):
         self.previous_beat_time = time.time()
 
@@ -5,6 +5,7 @@ import re
 import time
 
 from ..beat_handler_process import BeatHandlerProcess
+from ..beat_tracker import EventFlag
 from ..video.video_player import VideoPlayer
 from ..video.video_stream import VideoStream
 
@@ -152,6 +153,9 @@ class Warp(BeatHandlerProcess):
         if self.timing_function == TIMING_FUNCTION_BEZIER:
             self.bezier_curve = buffered_cubic_bezier(*self.timing_args)
 
+    def required_events(self):
+        return {EventFlag.BEAT, EventFlag.BPM}
+
     def handle_beat(self):
         t = time.time()
         distance_prev = abs(self.prev_beat_time - t)
@@ -7,6 +7,7 @@ import time
 
 import pygame
 
+from ..beat_tracker import EventFlag
 from .pygame_handler import PygameHandler
 
 
@@ -74,6 +75,9 @@ class Waves(PygameHandler):
         PygameHandler.setup(self, "BeatViewer: Waves")
         self.t0 = time.time()
 
+    def required_events(self):
+        return {EventFlag.BEAT}
+
     def handle_beat(self):
         self.gaussians.append(gaussian(time.time(), self.gaussian_sigma))
         if len(self.gaussians) > self.gaussians_buffer_size:
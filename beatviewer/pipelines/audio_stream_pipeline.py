@@ -1,36 +1,187 @@
 import logging
 
 import numpy
-import scipy.fftpack
+import scipy.fft
+
+from ..audio_source.audio_window import AudioWindow
+
+
+# Number of hops read at once when analyzing a whole audio source.
+OFFLINE_CHUNK_HOPS = 4096
 
 
 class AudioStreamPipeline:
+    """Compute the spectral flux of the audio stream. As audio samples are
+    real, only the half spectrum is computed, and bins that stand for two
+    symmetric bins of the full spectrum count twice in the flux. Spectrum
+    buffers are preallocated and swapped at each update.
+
+    When the energy of the audio window stays below a threshold for a while,
+    the silence gate closes: the spectral flux is not computed anymore until
+    the energy rises again.
+
+    Buffers use the floating point type of the audio source.
+    """
 
     def __init__(self, config, audio_source):
         logging.info("Creating audio stream pipeline")
         self.config = config
         self.audio_source = audio_source
-        self.sampling_rate = audio_source.sampling_rate
+        self.sampling_rate = audio_source.analysis_sampling_rate
+        self.dtype = audio_source.dtype
         self.audio_window = None 
+        self.fft = None
         self.previous_fft = None
+        self.fft_diff = None
+        self.fft_mask = None
+        self.flux_weights = None
         self.flux = None
+        self.silence_gate_frames = 0
+        self.silent_frames = 0
+        self.gated = False
     
     def setup(self):
         logging.info("Setting up audio stream pipeline")
         self.audio_source.setup()
-        self.audio_window = numpy.zeros(self.config.audio_window_size)
-        self.previous_fft = numpy.zeros(self.config.audio_window_size)
+        self.audio_window = AudioWindow(self.config.audio_window_size, dtype=self.dtype)
+        bins = self.config.audio_window_size // 2 + 1
+        self.fft = numpy.zeros(bins, dtype=self.dtype)
+        self.previous_fft = numpy.zeros(bins, dtype=self.dtype)
+        self.fft_diff = numpy.zeros(bins, dtype=self.dtype)
+        self.fft_mask = numpy.zeros(bins, dtype=bool)
+        self.flux_weights = numpy.full(bins, 2.0, dtype=self.dtype)
+        self.flux_weights[0] = 1
+        if self.config.audio_window_size % 2 == 0:
+            self.flux_weights[-1] = 1
+        self.silence_gate_frames = round(self.config.silence_gate_duration * self.sampling_rate / self.config.audio_hop_size)
+        self.silent_frames = 0
+        self.gated = False
+
+    def compute_spectrum(self, windows, out=None, mask=None):
+        """Compute the compressed and thresholded magnitude half spectrum of
+        audio windows, along their last axis. Computation is done in place in
+        `out` and `mask` if they are given.
+        """
+        fft = numpy.abs(scipy.fft.rfft(windows), out=out)
+        numpy.divide(fft, self.sampling_rate, out=fft)
+        g = self.config.compression_gamma
+        if g != 0:
+            numpy.multiply(fft, g, out=fft)
+            numpy.log1p(fft, out=fft)
+            numpy.divide(fft, numpy.log1p(g), out=fft)
+        mask = numpy.less(fft, self.config.noise_cancellation_threshold, out=mask)
+        numpy.copyto(fft, 0, where=mask)
+        return fft
 
     def update(self):
         logging.debug("Updating audio stream pipeline")
         self.audio_source.update_window(self.audio_window)
-        fft = numpy.abs(scipy.fftpack.fft(self.audio_window)) / self.sampling_rate
-        g = self.config.compression_gamma
-        if g != 0:
-            fft = numpy.log10(1 + g * fft) / numpy.log10(1 + g)
-        fft[fft < self.config.noise_cancellation_threshold] = 0
-        self.flux = numpy.sum(numpy.maximum(fft - self.previous_fft, 0))
-        self.previous_fft = fft
+        self.update_gate()
+        if self.gated:
+            return
+        self.compute_spectrum(self.audio_window.samples, out=self.fft, mask=self.fft_mask)
+        numpy.subtract(self.fft, self.previous_fft, out=self.fft_diff)
+        numpy.maximum(self.fft_diff, 0, out=self.fft_diff)
+        self.flux = numpy.dot(self.fft_diff, self.flux_weights)
+        self.fft, self.previous_fft = self.previous_fft, self.fft
+
+    def update_gate(self):
+        """Open or close the silence gate, depending on how long the energy of
+        the audio window has been below config.silence_gate_threshold.
+        """
+        if self.silence_gate_frames <= 0:
+            return
+        samples = self.audio_window.samples
+        if numpy.dot(samples, samples) < self.config.silence_gate_threshold:
+            self.silent_frames += 1
+        else:
+            self.silent_frames = 0
+        gated = self.silent_frames >= self.silence_gate_frames
+        if gated and not self.gated:
+            logging.info("Audio input is silent, closing the silence gate")
+            self.previous_fft[:] = 0
+        elif self.gated and not gated:
+            logging.info("Audio input is back, opening the silence gate")
+        self.gated = gated
+
+    def update_batch(self, count):
+        """Read up to `count` hops at once and compute the silence gate state
+        and the spectral flux of each resulting window in a single batch.
+        Return the flux values and the gate states.
+        """
+        logging.debug("Updating audio stream pipeline with %d hops", count)
+        hops = self.audio_source.read_hops(count)
+        samples = numpy.concatenate([self.audio_window.samples, hops.reshape(-1)])
+        windows = numpy.lib.stride_tricks.sliding_window_view(
+            samples, self.config.audio_window_size)[self.config.audio_hop_size::self.config.audio_hop_size]
+        self.audio_window.push(samples[-self.config.audio_window_size:])
+        if len(windows) == 0:
+            return numpy.zeros(0, dtype=self.dtype), numpy.zeros(0, dtype=bool)
+        flux, gated = self.compute_windows_flux(windows)
+        if not gated[-1]:
+            self.flux = flux[-1]
+        return flux, gated
+
+    def compute_offline(self):
+        """Read the whole audio source and compute the spectral flux of every
+        frame, in batches of OFFLINE_CHUNK_HOPS hops. Return an array of flux
+        values and an array telling which frames are gated. Flux values of
+        gated frames are zero, and must be ignored. As with hop by hop
+        updates, the last frame repeats the last window, once the source is
+        exhausted. Results are identical to hop by hop updates.
+        """
+        logging.info("Computing the spectral flux of the whole audio source")
+        samples = numpy.array(self.audio_window.samples)
+        flux_chunks = []
+        gated_chunks = []
+        while True:
+            hops = self.audio_source.read_hops(OFFLINE_CHUNK_HOPS)
+            if len(hops) == 0:
+                break
+            samples = numpy.concatenate([samples[-self.config.audio_window_size:], hops.reshape(-1)])
+            windows = numpy.lib.stride_tricks.sliding_window_view(
+                samples, self.config.audio_window_size)[self.config.audio_hop_size::self.config.audio_hop_size]
+            flux, gated = self.compute_windows_flux(windows)
+            flux_chunks.append(flux)
+            gated_chunks.append(gated)
+        self.audio_window.push(samples[-self.config.audio_window_size:])
+        flux, gated = self.compute_windows_flux(self.audio_window.samples[numpy.newaxis])
+        flux_chunks.append(flux)
+        gated_chunks.append(gated)
+        return numpy.concatenate(flux_chunks), numpy.concatenate(gated_chunks)
+
+    def compute_windows_flux(self, windows):
+        """Compute the silence gate state and the spectral flux of successive
+        audio windows, following the current state of the pipeline, which is
+        then updated. Dot products are computed window by window, in the same
+        order as hop by hop updates, so that results are identical.
+        """
+        n = len(windows)
+        gated = numpy.zeros(n, dtype=bool)
+        if self.silence_gate_frames > 0:
+            energy = numpy.fromiter(map(numpy.dot, windows, windows), dtype=self.dtype, count=n)
+            k = numpy.arange(n)
+            last_loud = numpy.maximum.accumulate(numpy.where(
+                energy < self.config.silence_gate_threshold, -1 - self.silent_frames, k))
+            silent_frames = k - last_loud
+            gated = silent_frames >= self.silence_gate_frames
+            self.silent_frames = int(silent_frames[-1])
+            self.gated = bool(gated[-1])
+        frames = numpy.flatnonzero(~gated)
+        spectra = self.compute_spectrum(windows[frames])
+        previous = numpy.zeros_like(spectra)
+        follows = frames[1:] - frames[:-1] == 1
+        previous[1:][follows] = spectra[:-1][follows]
+        if len(frames) > 0 and frames[0] == 0:
+            previous[0] = self.previous_fft
+        diff = numpy.maximum(spectra - previous, 0)
+        flux = numpy.zeros(n, dtype=self.dtype)
+        flux[frames] = numpy.fromiter(map(self.flux_weights.dot, diff), dtype=self.dtype, count=len(frames))
+        if gated[-1]:
+            self.previous_fft[:] = 0
+        else:
+            self.previous_fft[:] = spectra[-1]
+        return flux, gated
 
     def close(self):
         logging.info("Closing audio stream pipeline")
@@ -38,4 +189,4 @@ class AudioStreamPipeline:
     
     def rewind(self):
         logging.info("Rewinding audio stream pipeline")
-        self.audio_source.rewind()
\ No newline at end of file
+        self.audio_source.rewind()
@@ -1,7 +1,10 @@
+import functools
 import logging
 
 import numpy
 
+from ..ring_buffer import RingBuffer, ShiftRingBuffer, StatsRingBuffer
+
 
 def create_hamming_window(size, a0=25/46):
     arr = numpy.zeros(size)
@@ -10,18 +13,50 @@ def create_hamming_window(size, a0=25/46):
     return arr
 
 
+@functools.lru_cache(maxsize=64)
+def create_cbss_kernel(tempo_lag, eta, dtype="float64"):
+    """Log-gaussian weights of the previous CBSS values.
+    """
+    v = numpy.arange(-2 * tempo_lag, -tempo_lag // 2)
+    kernel = numpy.exp(-.5 * (eta * numpy.power(numpy.log(-v / tempo_lag), 2))).astype(dtype, copy=False)
+    kernel.setflags(write=False)
+    return kernel
+
+
+@functools.lru_cache(maxsize=64)
+def create_bps_pulse(tempo_lag, epsilon, gaussian_width, size, dtype="float64"):
+    """Gaussian pulse of a tempo lag, and BPS cell offsets within a period.
+    """
+    tt = numpy.arange(2 * tempo_lag) - (tempo_lag - epsilon)
+    pulse = numpy.exp(-numpy.power(tt, 2) / gaussian_width).astype(dtype, copy=False)
+    offsets = numpy.arange(size) % tempo_lag
+    pulse.setflags(write=False)
+    offsets.setflags(write=False)
+    return pulse, offsets
+
+
+def create_bps_template(tempo_lag, phi_max, epsilon, gaussian_width, size, dtype="float64"):
+    """Periodic gaussian pulses at the predicted next beat locations, added to
+    the BPS buffer at each frame, gathered from the cached pulse of the tempo
+    lag.
+    """
+    pulse, offsets = create_bps_pulse(tempo_lag, epsilon, gaussian_width, size, dtype)
+    return pulse[offsets + phi_max]
+
+
 class BeatTrackingPipeline:
 
     MODE_REGULAR = 0
     MODE_TEMPO_LOCKED = 1
 
-    def __init__(self, config):
+    def __init__(self, config, dtype="float64", track_beats=True):
         logging.info("Creating beat tracking pipeline")
         self.config = config
+        self.dtype = dtype
+        self.track_beats = track_beats
         self.mode = self.MODE_REGULAR
         self.flux_buffer = None
         self.oss_buffer = None
-        self.oss_buffer_size = 0
         self.oss_mean = 0
         self.oss_threshold = 0
         self.was_below_threshold = False
@@ -40,42 +75,64 @@ class BeatTrackingPipeline:
         """Instantiate object attributes.
         """
         logging.info("Setting up beat tracking pipeline")
-        self.flux_buffer = numpy.zeros((self.config.hamming_window_size))
-        self.oss_buffer = []
-        self.oss_buffer_size = 0
-        self.hamming_window = create_hamming_window(self.config.hamming_window_size)
-        self.cbss_buffer = [0] * self.config.cbss_buffer_size
-        self.bps_buffer = [0] * self.config.bps_buffer_size
+        self.flux_buffer = numpy.zeros(self.config.hamming_window_size, dtype=self.dtype)
+        self.oss_buffer = StatsRingBuffer(
+            max(self.config.oss_window_size, self.config.oss_buffer_size),
+            self.config.oss_buffer_size,
+            dtype=self.dtype
+        )
+        self.hamming_window = create_hamming_window(self.config.hamming_window_size).astype(self.dtype, copy=False)
+        self.cbss_buffer = RingBuffer(self.config.cbss_buffer_size, dtype=self.dtype)
+        self.bps_buffer = ShiftRingBuffer(self.config.bps_buffer_size, dtype=self.dtype)
 
     def enqueue_flux(self, flux):
         logging.debug("Enqueuing flux value %f", flux)
-        self.frame_index += 1
         self.flux_buffer[:self.config.hamming_window_size - 1] = self.flux_buffer[1:]
         self.flux_buffer[-1] = flux
-        self.update_oss()
+        self.enqueue_oss_value(numpy.sum(numpy.multiply(self.flux_buffer, self.hamming_window)))
+
+    def compute_oss(self, fluxes):
+        """Compute the OSS values of a series of flux values following the
+        ones in the flux buffer, at once, by sliding the hamming window over
+        the series. The flux buffer is not updated.
+        """
+        series = numpy.concatenate([self.flux_buffer[1:], fluxes])
+        windows = numpy.lib.stride_tricks.sliding_window_view(series, self.config.hamming_window_size)
+        return numpy.sum(numpy.multiply(windows, self.hamming_window), axis=1)
+
+    def enqueue_oss_value(self, oss):
+        """Move to the next frame, given its OSS value.
+        """
+        self.frame_index += 1
+        self.update_oss(oss)
+        if not self.track_beats:
+            return
         self.update_cbss()
         self.update_phi_max()
         self.update_bps()
         self.update_beat()
 
+    def skip_frame(self):
+        """Move to the next frame without updating any buffer, so that the
+        tracking state is kept as is.
+        """
+        self.frame_index += 1
+        self.onset_flag = False
+        self.beat_flag = False
+
     def set_tempo_lag(self, tempo_lag):
         """Set the tempo_lag attribute
         """
         if self.mode != self.MODE_TEMPO_LOCKED:
             self.tempo_lag = tempo_lag
 
-    def update_oss(self):
-        """Compute the next OSS value and store it into a buffer.
+    def update_oss(self, oss):
+        """Store the next OSS value into a buffer.
         Return whether there was an onset.
         """
-        oss = numpy.sum(numpy.multiply(self.flux_buffer, self.hamming_window))
-        if self.oss_buffer_size == max(self.config.oss_window_size, self.config.oss_buffer_size):
-            self.oss_buffer.pop(0)
-            self.oss_buffer_size -= 1
         self.oss_buffer.append(oss)
-        self.oss_buffer_size += 1
-        self.oss_mean = numpy.mean(self.oss_buffer[-self.config.oss_buffer_size:])
-        oss_std = numpy.sqrt(numpy.var(self.oss_buffer[-self.config.oss_buffer_size:]))
+        self.oss_mean = self.oss_buffer.mean
+        oss_std = numpy.sqrt(self.oss_buffer.var)
         self.oss_threshold = max(
             self.oss_mean + self.config.onset_threshold * oss_std,
             self.config.onset_threshold_min
@@ -92,57 +149,53 @@ class BeatTrackingPipeline:
     def update_cbss(self):
         """Compute the next CBSS value and store it into a buffer.
         """
-        self.cbss_buffer.pop(0)
-        self.cbss_buffer.append(0)
-        n = self.config.cbss_buffer_size - 1
+        kernel = create_cbss_kernel(self.tempo_lag, self.config.cbss_eta, self.dtype)
+        previous = self.cbss_buffer.values
+        n = self.config.cbss_buffer_size
+        start = max(1, n - 2 * self.tempo_lag)
+        end = n + (-self.tempo_lag // 2)
         phi = 0
-        for v in range(-2 * self.tempo_lag, -self.tempo_lag // 2):
-            if n + v < 0:
-                continue
-            gaussian_weight = numpy.exp(-.5 * (self.config.cbss_eta * numpy.power(numpy.log(-v/self.tempo_lag), 2)))
-            phi = max(phi, gaussian_weight * self.cbss_buffer[n + v])
+        if end > start:
+            weighted = kernel[start - n + 2 * self.tempo_lag:] * previous[start:end]
+            phi = max(phi, numpy.max(weighted))
         if self.mode == self.MODE_TEMPO_LOCKED:
-            self.cbss_buffer[n] = phi
+            self.cbss_buffer.append(phi)
         else:
-            self.cbss_buffer[n] = (1 - self.config.cbss_alpha) * self.oss_buffer[-1] + self.config.cbss_alpha * phi
+            self.cbss_buffer.append((1 - self.config.cbss_alpha) * self.oss_buffer.latest(1)[0] + self.config.cbss_alpha * phi)
     
     def update_phi_max(self):
-        """Compute the phase estimation.
+        """Compute the phase estimation. Phase values are the sums of the
+        CBSS at 4 successive beats before the current one, which are computed
+        at once by folding the end of the CBSS buffer into 4 rows.
         """
-        phi_max, phi_max_value = None, None
-        n = self.config.cbss_buffer_size - 1
-        for phi in range(self.tempo_lag):
-            phi_value = 0
-            for i in range(4):
-                if n - phi - i * self.tempo_lag < 0:
-                    continue
-                phi_value += self.cbss_buffer[n - phi - i * self.tempo_lag]
-            if phi_max is None or phi_value > phi_max_value:
-                phi_max, phi_max_value = phi, phi_value
-        self.phi_max = phi_max
+        m = min(4 * self.tempo_lag, self.config.cbss_buffer_size)
+        beats = numpy.zeros(4 * self.tempo_lag, dtype=self.dtype)
+        beats[-m:] = self.cbss_buffer.latest(m)
+        phi_values = beats.reshape(4, self.tempo_lag)[::-1].sum(axis=0)[::-1]
+        self.phi_max = int(numpy.argmax(phi_values))
 
     def update_bps(self):
         """Update the BPS buffer.
         """
-        self.bps_buffer.pop(0)
-        self.bps_buffer.append(0)
-        epsilon = self.config.bps_epsilon_o + self.config.bps_epsilon_r
-        tt = [
-            (i % self.tempo_lag) - (self.tempo_lag - self.phi_max - epsilon)
-            for i in range(self.config.bps_buffer_size)
-        ]
-        pmi = numpy.exp(-numpy.power(tt, 2) / self.config.bps_gaussian_width)
-        for i in range(self.config.bps_buffer_size):
-            self.bps_buffer[i] += pmi[i]
-        
+        self.bps_buffer.shift()
+        self.bps_buffer.add(create_bps_template(
+            self.tempo_lag,
+            self.phi_max,
+            self.config.bps_epsilon_o + self.config.bps_epsilon_r,
+            self.config.bps_gaussian_width,
+            self.config.bps_buffer_size,
+            self.dtype
+        ))
+
     def update_beat(self):
-        """Take the decision of the presence of a beat.
+        """Take the decision of the presence of a beat. The maximum of the BPS
+        buffer is only computed once the cooldown is over.
         """
         self.beat_flag = False
         if self.beat_cooldown > 0:
             self.beat_cooldown -= 1
             return False
-        self.beat_flag = self.bps_buffer[self.config.bps_epsilon_t] == max(self.bps_buffer)        
+        self.beat_flag = self.bps_buffer[self.config.bps_epsilon_t] == self.bps_buffer.max()
         if self.beat_flag:
             self.beat_cooldown = int(self.config.bps_cooldown_ratio * self.tempo_lag)
             logging.debug("Detected beat")
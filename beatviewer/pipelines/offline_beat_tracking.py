@@ -0,0 +1,76 @@
+import functools
+
+import numpy
+
+
+@functools.lru_cache(maxsize=64)
+def create_transition_penalty(tempo_lag, tightness):
+    """Beat intervals from tempo_lag / 2 to 2 * tempo_lag, and their penalties.
+    """
+    intervals = numpy.arange(max(1, round(tempo_lag / 2)), 2 * tempo_lag + 1)
+    penalty = -tightness * numpy.power(numpy.log(intervals / tempo_lag), 2)
+    intervals.setflags(write=False)
+    penalty.setflags(write=False)
+    return intervals, penalty
+
+
+def detect_onsets(oss, config):
+    """Detect onsets in a whole OSS series, with the same adaptive threshold
+    as the real-time pipeline: the mean plus config.onset_threshold times the
+    standard deviation of the last config.oss_buffer_size values. Rolling
+    statistics are computed from cumulative sums. Return onset frame indices.
+    """
+    n = len(oss)
+    if n == 0:
+        return numpy.zeros(0, dtype=int)
+    values = oss.astype("float64")
+    sums = numpy.concatenate([[0], numpy.cumsum(values)])
+    sums_squares = numpy.concatenate([[0], numpy.cumsum(values * values)])
+    end = numpy.arange(1, n + 1)
+    start = numpy.maximum(0, end - config.oss_buffer_size)
+    count = end - start
+    mean = (sums[end] - sums[start]) / count
+    var = numpy.maximum(0, (sums_squares[end] - sums_squares[start]) / count - mean ** 2)
+    threshold = numpy.maximum(mean + config.onset_threshold * numpy.sqrt(var), config.onset_threshold_min)
+    below = values < threshold
+    return numpy.flatnonzero(~below[1:] & below[:-1]) + 1
+
+
+def track_beats(oss, tempo_lags, tightness):
+    """Find the sequence of beats maximizing the OSS at beats, minus a penalty
+    for intervals departing from the local tempo lag, by dynamic programming
+    (see Ellis, "Beat Tracking by Dynamic Programming", 2007). `tempo_lags`
+    gives the tempo lag at every frame. Scores of frames within half a tempo
+    lag only depend on earlier frames, so they are computed in blocks. Return
+    beat frame indices.
+    """
+    n = len(oss)
+    if n == 0:
+        return numpy.zeros(0, dtype=int)
+    std = numpy.std(oss)
+    score = oss / std if std > 0 else numpy.array(oss, dtype="float64")
+    score = score.astype("float64")
+    backlink = numpy.full(n, -1)
+    changes = numpy.flatnonzero(tempo_lags[1:] != tempo_lags[:-1]) + 1
+    boundaries = numpy.concatenate([changes, [n]])
+    t = 0
+    for boundary in boundaries:
+        tempo_lag = int(tempo_lags[t])
+        intervals, penalty = create_transition_penalty(tempo_lag, tightness)
+        while t < boundary:
+            frames = numpy.arange(t, min(t + intervals[0], boundary))
+            previous = frames[:, numpy.newaxis] - intervals[numpy.newaxis]
+            candidates = numpy.where(previous >= 0, score[numpy.maximum(previous, 0)] + penalty, -numpy.inf)
+            best = numpy.argmax(candidates, axis=1)
+            rows = numpy.arange(len(frames))
+            linked = previous[rows, best] >= 0
+            score[frames[linked]] += candidates[rows, best][linked]
+            backlink[frames[linked]] = previous[rows, best][linked]
+            t = frames[-1] + 1
+    last_tempo_lag = int(tempo_lags[-1])
+    beat = n - last_tempo_lag + int(numpy.argmax(score[-last_tempo_lag:])) if n > last_tempo_lag else int(numpy.argmax(score))
+    beats = []
+    while beat >= 0:
+        beats.append(beat)
+        beat = backlink[beat]
+    return numpy.array(beats[::-1], dtype=int)
@@ -1,62 +1,396 @@
+import functools
 import logging
 import math
 
+import numpy
+
+from ..audio_source.audio_source import get_pipeline_dtype
 from .audio_stream_pipeline import AudioStreamPipeline
 from .beat_tracking_pipeline import BeatTrackingPipeline
 from .tempo_estimation_pipeline import TempoEstimationPipepline
+from .tempo_estimation_worker import TempoEstimationWorker
 
 
 EXTRA_WARMUP_BEATS = 4
+# Relative change of the accumulator confidence, and change of the OSS mean in
+# standard deviations, above which tempo is considered unstable.
+TEMPO_CONFIDENCE_TOLERANCE = .1
+TEMPO_OSS_MEAN_TOLERANCE = 1
+# Config entries that must be equal for pipelines sharing the spectral flux.
+FRONT_END_CONFIG_KEYS = [
+    "analysis_sampling_rate",
+    "audio_window_size",
+    "audio_hop_size",
+    "compression_gamma",
+    "noise_cancellation_threshold",
+    "silence_gate_threshold",
+    "silence_gate_duration",
+]
 
 
 class Pipeline(AudioStreamPipeline, BeatTrackingPipeline, TempoEstimationPipepline):
+    """Full analysis pipeline, from the audio source to beat tracking and
+    tempo estimation. If `track_beats` is False, only onsets are detected, and
+    if `estimate_tempo` is False, tempo is never estimated.
+    """
 
-    def __init__(self, config, audio_source):
-        logging.info("Creating pipeline")
+    def __init__(self, config, audio_source, track_beats=True, estimate_tempo=True, analysis_cache=None):
+        logging.info(
+            "Creating pipeline, beat tracking is %s, tempo estimation is %s",
+            track_beats,
+            estimate_tempo
+        )
         AudioStreamPipeline.__init__(self, config, audio_source)
-        BeatTrackingPipeline.__init__(self, config)
-        TempoEstimationPipepline.__init__(self, audio_source.sampling_rate / config.audio_hop_size, config)
+        BeatTrackingPipeline.__init__(self, config, audio_source.dtype, track_beats)
+        TempoEstimationPipepline.__init__(self, audio_source.analysis_sampling_rate / config.audio_hop_size, config, audio_source.dtype)
+        self.estimate_tempo = estimate_tempo
         self.oss_buffer_counter = None
         self.bpm_flag = False
         self.active = True
         self.warmup_end = None
+        self.tempo_worker = None
+        self.tempo_update_interval = None
+        self.tempo_confidence = None
+        self.tempo_oss_mean = None
+        self.tempo_oss_std = None
+        self.leader = None
+        self.followers = []
+        self.offline_flux = None
+        self.offline_gated = None
+        self.offline_oss = None
+        self.offline_cursor = 0
+        self.analysis_cache = analysis_cache
+        self.flux_history = None
+        self.history_cursor = None
+        self.replay_end = None
+        self.tempo_seeded = False
+
+    def add_follower(self, follower):
+        """Feed another pipeline, built on the same audio source, with the
+        spectral flux of this one. Followers are set up, updated, rewound and
+        closed along with this pipeline. The flux is computed only once, and
+        followers run their own beat tracking and tempo estimation, with their
+        own config, which must match this one for the entries of
+        FRONT_END_CONFIG_KEYS, and for the pipeline dtype.
+        """
+        if follower.audio_source is not self.audio_source:
+            raise ValueError("Followers must be built on the audio source of their leader")
+        for key in FRONT_END_CONFIG_KEYS:
+            if getattr(follower.config, key) != getattr(self.config, key):
+                raise ValueError(f"Follower config differs from its leader config for '{key}'")
+        if get_pipeline_dtype(follower.config, self.audio_source.live) != self.dtype:
+            raise ValueError("Follower config differs from its leader config for 'pipeline_dtype'")
+        logging.info("Adding pipeline follower")
+        follower.leader = self
+        self.followers.append(follower)
 
     def setup(self):
+        """Set up the stages. With live audio sources, and unless
+        config.tempo_estimation_async is 0, tempo is estimated by a background
+        worker, and new tempi are applied when they become available.
+        Otherwise, tempo is estimated inline, which is deterministic. With
+        offline audio sources, the spectral flux and the OSS of the whole
+        source are computed at once (see `setup_offline`), and then replayed
+        frame by frame.
+        """
         logging.info("Setting up pipeline")
-        AudioStreamPipeline.setup(self)
-        BeatTrackingPipeline.setup(self)
+        if self.leader is None:
+            AudioStreamPipeline.setup(self)
         TempoEstimationPipepline.setup(self)
+        # The OSS buffer is shared with the tempo estimation pipeline
+        BeatTrackingPipeline.setup(self)
         self.oss_buffer_counter = 0
+        self.tempo_update_interval = self.config.oss_hop_size
+        if self.estimate_tempo and self.config.tempo_estimation_async and self.audio_source.live:
+            logging.info("Starting tempo estimation worker")
+            self.tempo_worker = TempoEstimationWorker(functools.partial(TempoEstimationPipepline.update, self))
+            self.tempo_worker.start()
+        for follower in self.followers:
+            follower.setup()
+        if self.leader is None and self.audio_source.offline:
+            self.setup_offline()
+            self.offline_cursor = 0
+            logging.info("Computed spectral flux and OSS of %d frames", len(self.offline_flux))
+
+    def front_end_cache_params(self):
+        """Return the parameters the spectral flux depends on, as a key for
+        the analysis cache.
+        """
+        config = self.config.to_dict()
+        return {
+            **{key: config[key] for key in FRONT_END_CONFIG_KEYS},
+            "sampling_rate": self.audio_source.sampling_rate,
+            "dtype": numpy.dtype(self.dtype).name,
+        }
+
+    def setup_offline(self):
+        """Compute the spectral flux, the gate state and the OSS of the whole
+        offline source, or load them from the analysis cache, if one is given,
+        and store them otherwise. The flux and the OSS are cached separately,
+        so that the flux is reused when only the OSS parameters change.
+        """
+        if self.analysis_cache is None:
+            self.offline_flux, self.offline_gated = AudioStreamPipeline.compute_offline(self)
+            self.offline_oss = self.compute_offline_oss()
+            return
+        source_hash = self.analysis_cache.hash_source(self.audio_source.path)
+        flux_params = self.front_end_cache_params()
+        entry = self.analysis_cache.load("flux", source_hash, flux_params)
+        if entry is None:
+            self.offline_flux, self.offline_gated = AudioStreamPipeline.compute_offline(self)
+            self.analysis_cache.store("flux", source_hash, flux_params, {
+                "flux": self.offline_flux,
+                "gated": self.offline_gated,
+            }, {"path": self.audio_source.path})
+        else:
+            self.offline_flux, self.offline_gated = entry[0]["flux"], entry[0]["gated"]
+        oss_params = {**flux_params, "hamming_window_size": self.config.hamming_window_size}
+        entry = self.analysis_cache.load("oss", source_hash, oss_params)
+        if entry is None:
+            self.offline_oss = self.compute_offline_oss()
+            self.analysis_cache.store("oss", source_hash, oss_params, {
+                "oss": self.offline_oss,
+            }, {"path": self.audio_source.path})
+        else:
+            self.offline_oss = entry[0]["oss"]
+
+    def compute_offline_oss(self):
+        """Compute the OSS of every ungated frame of the offline flux series,
+        following the current content of the flux buffer.
+        """
+        ungated = ~self.offline_gated
+        oss = numpy.zeros(len(self.offline_flux), dtype=self.dtype)
+        oss[ungated] = BeatTrackingPipeline.compute_oss(self, self.offline_flux[ungated])
+        return oss
+
+    def record_history(self):
+        """Start recording the spectral flux read from the audio source during
+        the warmup, so that the next rewind replays the recorded frames before
+        reading the source further. This has no effect with offline sources,
+        whose flux is always kept, and replayed by rewinds. If the
+        warmup end is still unknown after `history_frame_limit` frames, which
+        happens when frames are gated, the history is dropped, and rewinding
+        reads the source again.
+        """
+        if self.offline_flux is None:
+            logging.info("Recording spectral flux history")
+            self.flux_history = []
     
     def update(self):
         logging.debug("Updating pipeline")
-        AudioStreamPipeline.update(self)
+        if self.offline_flux is not None:
+            self.update_offline()
+            return
+        if self.history_cursor is not None:
+            self.update_history()
+            return
+        backlog = self.audio_source.backlog
+        if self.config.catch_up_backlog > 0 and backlog >= self.config.catch_up_backlog:
+            fluxes = self.catch_up(backlog)
+        else:
+            AudioStreamPipeline.update(self)
+            fluxes = None if self.gated else [self.flux]
         self.active = self.audio_source.active
-        BeatTrackingPipeline.enqueue_flux(self, self.flux)
-        self.oss_buffer_counter += 1
+        if self.flux_history is not None:
+            self.flux_history.append(fluxes)
+        self.follow(fluxes)
+        for follower in self.followers:
+            follower.follow(fluxes)
+        if self.flux_history is not None and self.warmup_end is None and self.frame_index > self.history_frame_limit():
+            logging.warning("Warmup end still unknown after %d frames, dropping the spectral flux history", self.frame_index)
+            self.flux_history = None
+
+    def history_frame_limit(self):
+        """Number of frames after which the warmup end is known, if no frame
+        is gated: the first tempo estimation needs a full OSS window, and
+        comes at most one estimation interval later, plus one more for
+        asynchronous results. Once known, the warmup end is at most
+        EXTRA_WARMUP_BEATS + 1 beats away.
+        """
+        return self.config.oss_window_size + 2 * self.config.oss_hop_size_max
+
+    def update_history(self):
+        """Replay the next recorded flux values. Once all of them are
+        replayed, the history is dropped and the audio source is read again.
+        """
+        fluxes = self.flux_history[self.history_cursor]
+        self.history_cursor += 1
+        if self.history_cursor == len(self.flux_history):
+            self.flux_history = None
+            self.history_cursor = None
+        if fluxes is None or len(fluxes) > 0:
+            self.gated = fluxes is None or fluxes[-1] is None
+        if not self.gated:
+            self.flux = fluxes[-1]
+        self.follow(fluxes)
+        for follower in self.followers:
+            follower.follow(fluxes)
+
+    def update_offline(self):
+        """Replay the next frame of the offline flux and OSS series.
+        """
+        k = self.offline_cursor
+        self.offline_cursor += 1
+        self.active = self.offline_cursor < len(self.offline_flux)
+        self.gated = bool(self.offline_gated[k])
+        if self.gated:
+            self.follow(None)
+            for follower in self.followers:
+                follower.follow(None)
+            return
+        self.flux = self.offline_flux[k]
+        self.follow([self.flux], [self.offline_oss[k]])
+        for follower in self.followers:
+            follower.follow([self.flux])
+
+    def catch_up(self, count):
+        """Compute the spectral flux of `count` queued hops in a single batch,
+        when the analysis lags behind the audio input by at least
+        config.catch_up_backlog hops. The tempo is then
+        updated at most once. Only the flags of the last frame are kept, so no
+        event is emitted for stale frames. Return the flux values, with None
+        for the frames gated by the silence gate.
+        """
+        logging.debug("Catching up with %d hops", count)
+        flux, gated = AudioStreamPipeline.update_batch(self, count)
+        return [None if gated[k] else flux[k] for k in range(len(flux))]
+
+    def follow(self, fluxes, oss_values=None):
+        """Run beat tracking and tempo estimation on new spectral flux values,
+        or skip a frame if `fluxes` is None, when the silence gate is closed.
+        Frames whose flux value is None are skipped as well. If the matching
+        OSS values are already known, they can be given.
+        """
+        if fluxes is None:
+            BeatTrackingPipeline.skip_frame(self)
+            self.bpm_flag = False
+            return
+        if oss_values is None:
+            for flux in fluxes:
+                if flux is None:
+                    BeatTrackingPipeline.skip_frame(self)
+                else:
+                    BeatTrackingPipeline.enqueue_flux(self, flux)
+        else:
+            for oss in oss_values:
+                BeatTrackingPipeline.enqueue_oss_value(self, oss)
+        self.oss_buffer_counter += sum(flux is not None for flux in fluxes)
+        if len(fluxes) > 0 and fluxes[-1] is None:
+            self.bpm_flag = False
+            return
+        if self.replay_end is not None and self.frame_index < self.replay_end:
+            self.bpm_flag = self.tempo_seeded
+            self.tempo_seeded = False
+            return
+        self.replay_end = None
+        if self.estimate_tempo:
+            self.update_tempo()
+
+    def update_tempo(self):
         self.bpm_flag = False
-        if self.oss_buffer_counter >= self.config.oss_hop_size and self.oss_buffer_size == self.config.oss_window_size:
+        if self.oss_buffer.count >= self.config.oss_window_size and self.tempo_update_due():
             self.oss_buffer_counter = 0
-            TempoEstimationPipepline.update(self)
-            if self.scaled_tempo_lag is None:
-                return
-            new_tempo_lag = int(self.scaled_tempo_lag)
-            if new_tempo_lag != self.tempo_lag:
-                self.tempo_lag = new_tempo_lag
-                self.bpm_flag = True
-                logging.debug("New tempo lag: %d", self.tempo_lag)
-            if self.warmup_end is None:
-                self.warmup_end = (EXTRA_WARMUP_BEATS + math.ceil(self.frame_index / new_tempo_lag)) * new_tempo_lag
-                logging.info("Setting warmup end to: %d (frame index %d, tempo lag %d)", self.warmup_end, self.frame_index, new_tempo_lag)
+            self.tempo_oss_mean = self.oss_mean
+            self.tempo_oss_std = math.sqrt(self.oss_buffer.var)
+            if self.tempo_worker is None:
+                self.apply_tempo(*TempoEstimationPipepline.update(self))
+            else:
+                self.tempo_worker.submit(
+                    self.oss_buffer.latest(self.config.oss_window_size).copy(),
+                    self.frame_index
+                )
+        if self.tempo_worker is not None:
+            result = self.tempo_worker.poll()
+            if result is not None:
+                estimation, frame_index, latency = result
+                logging.debug(
+                    "Tempo estimated in %.1f ms, %d frames late",
+                    1000 * latency,
+                    self.frame_index - frame_index
+                )
+                if latency > self.config.oss_hop_size / self.oss_sampling_rate:
+                    logging.warning("Tempo estimation took %.1f ms, longer than the tempo update interval", 1000 * latency)
+                self.apply_tempo(*estimation)
+
+    def tempo_update_due(self):
+        """Tell whether tempo should be estimated at this frame. Tempo is
+        estimated every config.oss_hop_size frames at first. While the tempo
+        and the accumulator confidence stay stable, the interval doubles, up
+        to config.oss_hop_size_max frames (see `apply_tempo`). It goes back to
+        its minimum as soon as either changes, or when the OSS mean drifts
+        from its value at the last estimation. By default, both bounds are
+        equal, and the interval is fixed.
+        """
+        if self.oss_buffer_counter >= self.tempo_update_interval:
+            return True
+        if self.oss_buffer_counter < self.config.oss_hop_size or self.tempo_update_interval == self.config.oss_hop_size:
+            return False
+        if abs(self.oss_mean - self.tempo_oss_mean) > TEMPO_OSS_MEAN_TOLERANCE * self.tempo_oss_std:
+            logging.debug("OSS mean drifted, resetting tempo update interval")
+            self.tempo_update_interval = self.config.oss_hop_size
+            return True
+        return False
+
+    def apply_tempo(self, scaled_tempo_lag, confidence):
+        if scaled_tempo_lag is None:
+            return
+        new_tempo_lag = int(scaled_tempo_lag)
+        stable = new_tempo_lag == self.tempo_lag and self.tempo_confidence is not None\
+            and abs(confidence - self.tempo_confidence) <= TEMPO_CONFIDENCE_TOLERANCE * self.tempo_confidence
+        self.tempo_confidence = confidence
+        if stable:
+            self.tempo_update_interval = min(2 * self.tempo_update_interval, self.config.oss_hop_size_max)
+        else:
+            self.tempo_update_interval = self.config.oss_hop_size
+        if new_tempo_lag != self.tempo_lag:
+            self.tempo_lag = new_tempo_lag
+            self.bpm_flag = True
+            logging.debug("New tempo lag: %d", self.tempo_lag)
+        if self.warmup_end is None:
+            self.warmup_end = (EXTRA_WARMUP_BEATS + math.ceil(self.frame_index / new_tempo_lag)) * new_tempo_lag
+            logging.info("Setting warmup end to: %d (frame index %d, tempo lag %d)", self.warmup_end, self.frame_index, new_tempo_lag)
 
     def close(self):
         logging.info("Closing pipeline")
-        AudioStreamPipeline.close(self)
+        for follower in self.followers:
+            follower.close()
+        if self.tempo_worker is not None:
+            self.tempo_worker.close()
+        if self.leader is None:
+            AudioStreamPipeline.close(self)
 
     @property
     def bpm(self):
         return 60 * self.oss_sampling_rate / self.tempo_lag
     
     def rewind(self):
-        AudioStreamPipeline.rewind(self)
-        BeatTrackingPipeline.rewind(self)
\ No newline at end of file
+        """Restart the analysis from the beginning of the source. Tempo is not
+        estimated again until the replay reaches the frame where the pipeline
+        was rewound: the tempo found so far is kept, and reported again on the
+        first replayed frame.
+        """
+        self.replay_end = self.frame_index
+        self.tempo_seeded = self.estimate_tempo and self.warmup_end is not None
+        if self.offline_flux is not None:
+            self.rewind_offline()
+        elif self.flux_history is not None:
+            logging.info("Replaying %d recorded frames", len(self.flux_history))
+            self.history_cursor = 0
+        elif self.leader is None:
+            AudioStreamPipeline.rewind(self)
+        BeatTrackingPipeline.rewind(self)
+        if self.tempo_worker is not None:
+            self.tempo_worker.clear()
+        for follower in self.followers:
+            follower.rewind()
+
+    def rewind_offline(self):
+        """Restart the replay of the offline series, without reading the
+        source again. The flux buffer is set as it would be after the frames
+        replayed so far, and the OSS series is computed again from it.
+        """
+        logging.info("Rewinding offline pipeline")
+        replayed = self.offline_flux[:self.offline_cursor][~self.offline_gated[:self.offline_cursor]]
+        self.flux_buffer[:] = numpy.concatenate([self.flux_buffer, replayed])[-self.config.hamming_window_size:]
+        self.offline_oss = self.compute_offline_oss()
+        self.offline_cursor = 0
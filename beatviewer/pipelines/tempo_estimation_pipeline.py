@@ -1,48 +1,66 @@
+import functools
 import logging
 
 import numpy
 import scipy.signal
 import scipy.fftpack
 
+from ..ring_buffer import RingBuffer
 
-def create_pulse_trains(t_min, t_max):
-    pulse_trains = {}
-    for candidate_tempo in range(t_min, t_max + 1):
-        for phi in range(candidate_tempo):
-            pulse_trains[candidate_tempo, phi] = {}
-            for pulse_index, pulse_weight in zip([1, 1.5, 2], [1, .5, .5]):
-                for beat_index in [0, 1, 2, 3]:
-                    i = int(phi + pulse_index * beat_index * candidate_tempo)
-                    pulse_trains[candidate_tempo, phi].setdefault(i, 0)
-                    pulse_trains[candidate_tempo, phi][i] += pulse_weight
-    return pulse_trains
+
+@functools.lru_cache(maxsize=512)
+def create_pulse_train(candidate_tempo):
+    """Offsets from the phase, and weights, of the pulses of a candidate tempo lag.
+    """
+    pulses = {}
+    for pulse_index, pulse_weight in zip([1, 1.5, 2], [1, .5, .5]):
+        for beat_index in [0, 1, 2, 3]:
+            i = int(pulse_index * beat_index * candidate_tempo)
+            pulses.setdefault(i, 0)
+            pulses[i] += pulse_weight
+    offsets = numpy.array(list(pulses.keys()))
+    weights = numpy.array(list(pulses.values()))
+    offsets.setflags(write=False)
+    weights.setflags(write=False)
+    return offsets, weights
 
 
 class TempoEstimationPipepline:
 
-    def __init__(self, oss_sampling_rate, config):
+    def __init__(self, oss_sampling_rate, config, dtype="float64"):
         logging.info("Creating tempo estimation pipeline")
         self.oss_sampling_rate = oss_sampling_rate
         self.config = config
+        self.dtype = dtype
         self.t_min = None
         self.t_max = None
         self.oss_buffer = None
-        self.oss_buffer_size = None
+        self.oss_window = None
         self.eac = None
-        self.pulse_trains = None
         self.instant_tempo_lag = None
         self.accumulator = None
+        self.accumulator_kernel = None
         self.accumulated_tempo_lag = None
+        self.confidence = None
         self.scaled_tempo_lag = None
 
     def setup(self):
         logging.info("Setting up tempo estimation pipeline")
         self.t_min = int(60 * self.oss_sampling_rate / self.config.max_bpm_detection)
         self.t_max = int(60 * self.oss_sampling_rate / self.config.min_bpm_detection)
-        self.oss_buffer = []
-        self.oss_buffer_size = 0
-        self.pulse_trains = create_pulse_trains(self.t_min, self.t_max)
-        self.accumulator = numpy.zeros(self.t_max - self.t_min + 1)
+        self.oss_buffer = RingBuffer(self.config.oss_window_size, dtype=self.dtype)
+        self.accumulator = numpy.zeros(self.t_max - self.t_min + 1, dtype=self.dtype)
+        self.accumulator_kernel = self.create_accumulator_kernel()
+
+    def create_accumulator_kernel(self):
+        """Gaussian added to the accumulator, centered on the instant tempo
+        lag. It is computed once for every lag difference between -(t_max -
+        t_min) and t_max - t_min, and sliced at each update.
+        """
+        d = numpy.arange(self.t_min - self.t_max, self.t_max - self.t_min + 1)
+        s = self.config.tempo_accumulator_gaussian_width
+        kernel = 1 / (s * numpy.sqrt(2 * numpy.pi)) * numpy.exp(-.5 * numpy.power(d / s, 2))
+        return kernel.astype(self.dtype, copy=False)
 
     def enqueue_oss(self, oss):
         """Enqueue an OSS to the tempo estimator window. If the window reaches
@@ -50,29 +68,34 @@ class TempoEstimationPipepline:
         returns True. Otherwise it returns False.
         """
         self.oss_buffer.append(oss)
-        self.oss_buffer_size += 1
-        if self.oss_buffer_size == self.config.oss_window_size:
+        elapsed = self.oss_buffer.total - self.config.oss_window_size
+        if elapsed >= 0 and elapsed % self.config.oss_hop_size == 0:
             self.update()
-            del self.oss_buffer[:self.config.oss_hop_size]
-            self.oss_buffer_size -= self.config.oss_hop_size
             return True
         return False
     
-    def update(self):
+    def update(self, oss_window=None):
+        """Estimate the tempo from an OSS window, by default the latest one,
+        and return the scaled tempo lag and the confidence of the accumulator.
+        """
         logging.debug("Updating tempo estimation pipeline")
+        if oss_window is None:
+            oss_window = self.oss_buffer.latest(self.config.oss_window_size)
+        self.oss_window = oss_window
         self.update_eac()
         self.update_instant_tempo_lag()
         self.update_accumulator()
+        return self.scaled_tempo_lag, self.confidence
 
     def update_eac(self):
         corr = numpy.abs(scipy.fftpack.ifft(numpy.power(
-            numpy.abs(scipy.fftpack.fft(self.oss_buffer)),
+            numpy.abs(scipy.fftpack.fft(self.oss_window)),
             self.config.frequency_domain_compression)))
+        q = self.config.oss_window_size // 4
+        h = self.config.oss_window_size // 2
         self.eac = numpy.copy(corr)
-        for t in range(self.config.oss_window_size // 4):
-            self.eac[t] += corr[2 * t] + corr[4 * t]
-        for t in range(self.config.oss_window_size // 4, self.config.oss_window_size // 2):
-            self.eac[t] += corr[2 * t]
+        self.eac[:q] += corr[:2 * q:2] + corr[:4 * q:4]
+        self.eac[q:h] += corr[2 * q:2 * h:2]
     
     def update_instant_tempo_lag(self):
         peaks = scipy.signal.find_peaks(self.eac[self.t_min:self.t_max + 1])[0] + self.t_min
@@ -85,12 +108,7 @@ class TempoEstimationPipepline:
         scores_maximum = numpy.zeros(tempo_candidates)
         scores_maximum_sum = 0
         for j, candidate_tempo in enumerate(peaks[top_peaks]):
-            pulse_train_correlation = numpy.zeros(candidate_tempo)
-            for phi in range(candidate_tempo):
-                for i, v in self.pulse_trains[candidate_tempo, phi].items():
-                    if i >= self.config.oss_window_size:
-                        continue
-                    pulse_train_correlation[phi] += v * self.oss_buffer[i]
+            pulse_train_correlation = self.correlate_pulse_train(candidate_tempo)
             variance = numpy.var(pulse_train_correlation)
             scores_variance[j] = variance
             scores_variance_sum += variance
@@ -105,14 +123,27 @@ class TempoEstimationPipepline:
         j_max = numpy.argmax(scores)
         self.instant_tempo_lag = peaks[top_peaks][j_max]
     
+    def correlate_pulse_train(self, candidate_tempo):
+        """Correlation of the OSS window with the pulse train of a candidate
+        tempo lag, for every phase. Each pulse adds a weighted slice of the
+        window to all phases at once; pulses past the window are ignored.
+        """
+        offsets, weights = create_pulse_train(candidate_tempo)
+        correlation = numpy.zeros(candidate_tempo, dtype=self.dtype)
+        for offset, weight in zip(offsets, weights):
+            n = min(candidate_tempo, self.config.oss_window_size - offset)
+            if n > 0:
+                correlation[:n] += weight * self.oss_window[offset:offset + n]
+        return correlation
+
     def update_accumulator(self):
         if self.instant_tempo_lag is None:
             return
-        t = list(range(self.t_min, self.t_max + 1))
         self.accumulator *= self.config.tempo_accumulator_decay
-        s = self.config.tempo_accumulator_gaussian_width
-        self.accumulator += 1 / (s * numpy.sqrt(2 * numpy.pi)) * numpy.exp(-.5 * numpy.power((t - self.instant_tempo_lag) / s, 2))
+        start = self.t_max - self.instant_tempo_lag
+        self.accumulator += self.accumulator_kernel[start:start + len(self.accumulator)]
         self.accumulated_tempo_lag = numpy.argmax(self.accumulator) + self.t_min
+        self.confidence = self.accumulator[self.accumulated_tempo_lag - self.t_min] / numpy.sum(self.accumulator)
         bpm = 60 * self.oss_sampling_rate / self.accumulated_tempo_lag
         while bpm <= self.config.min_bpm_rescaled:
             bpm *= 2
@@ -0,0 +1,85 @@
+import logging
+import threading
+import time
+
+
+class TempoEstimationWorker(threading.Thread):
+    """Background thread running tempo estimations, so that the per-hop loop
+    never waits for them. The loop submits OSS windows and polls for results.
+    Only the latest submitted window is kept: if the worker is still busy when
+    a new window arrives, the older one is skipped, which bounds the latency
+    of results to about two estimation durations.
+
+    `estimate` is called from the worker thread with an OSS window, and its
+    return value is passed back as is by `poll`.
+    """
+
+    def __init__(self, estimate):
+        threading.Thread.__init__(self, daemon=True)
+        self.estimate = estimate
+        self.condition = threading.Condition()
+        self.pending = None
+        self.result = None
+        self.running = True
+        self.estimations = 0
+        self.skipped = 0
+        self.total_latency = 0
+        self.max_latency = 0
+
+    def submit(self, oss_window, frame_index):
+        """Queue an OSS window for estimation, without waiting.
+        """
+        oss_window.setflags(write=False)
+        with self.condition:
+            if self.pending is not None:
+                self.skipped += 1
+            self.pending = oss_window, frame_index, time.perf_counter()
+            self.condition.notify()
+
+    def poll(self):
+        """Return the latest result as a tuple (estimation result, frame index
+        of the submitted window, latency in seconds), or None if no new result
+        is available.
+        """
+        with self.condition:
+            result, self.result = self.result, None
+        return result
+
+    def clear(self):
+        """Forget the pending window and the unread result.
+        """
+        with self.condition:
+            self.pending = None
+            self.result = None
+
+    def run(self):
+        while True:
+            with self.condition:
+                while self.running and self.pending is None:
+                    self.condition.wait()
+                if not self.running:
+                    break
+                oss_window, frame_index, submitted = self.pending
+                self.pending = None
+            estimation = self.estimate(oss_window)
+            latency = time.perf_counter() - submitted
+            with self.condition:
+                self.result = estimation, frame_index, latency
+                self.estimations += 1
+                self.total_latency += latency
+                self.max_latency = max(self.max_latency, latency)
+
+    def close(self):
+        """Stop the thread once the current estimation is over.
+        """
+        with self.condition:
+            self.running = False
+            self.condition.notify()
+        self.join()
+        logging.info(
+            "Tempo estimation worker ran %d estimations, skipped %d windows, mean latency %.1f ms, max latency %.1f ms",
+            self.estimations,
+            self.skipped,
+            1000 * self.total_latency / max(1, self.estimations),
+            1000 * self.max_latency
+        )
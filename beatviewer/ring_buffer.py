@@ -0,0 +1,162 @@
+import numpy
+
+
+class RingBuffer:
+    """Circular buffer holding the last `size` values pushed to it. Every value
+    is stored twice, in two mirrored halves of an array of length `2 * size`,
+    so that the newest values can always be read as one contiguous view.
+    Pushing new values only writes them (twice), previous values are never
+    shifted.
+    """
+
+    def __init__(self, size, dtype="float64"):
+        self.size = size
+        self.buffer = numpy.zeros(2 * size, dtype=dtype)
+        self.cursor = 0
+        self.count = 0
+        self.total = 0
+
+    def push(self, values):
+        """Write values in place of the oldest ones. If there are more values
+        than the buffer size, only the newest ones are kept.
+        """
+        self.total += len(values)
+        if len(values) > self.size:
+            values = values[-self.size:]
+        n = len(values)
+        start = self.cursor
+        end = start + n
+        if end <= self.size:
+            self.buffer[start:end] = values
+            self.buffer[start + self.size:end + self.size] = values
+        else:
+            k = self.size - start
+            self.buffer[start:self.size] = values[:k]
+            self.buffer[start + self.size:] = values[:k]
+            self.buffer[:n - k] = values[k:]
+            self.buffer[self.size:self.size + n - k] = values[k:]
+        self.cursor = end % self.size
+        self.count = min(self.count + n, self.size)
+
+    def append(self, value):
+        """Write a single value in place of the oldest one.
+        """
+        self.buffer[self.cursor] = value
+        self.buffer[self.cursor + self.size] = value
+        self.cursor += 1
+        if self.cursor == self.size:
+            self.cursor = 0
+        if self.count < self.size:
+            self.count += 1
+        self.total += 1
+
+    @property
+    def values(self):
+        """Contiguous view of the buffer, from the oldest to the newest value.
+        """
+        return self.buffer[self.cursor:self.cursor + self.size]
+
+    def latest(self, n):
+        """Contiguous view of the `n` newest values.
+        """
+        return self.buffer[self.cursor + self.size - n:self.cursor + self.size]
+
+    def clear(self):
+        self.buffer[:] = 0
+        self.cursor = 0
+        self.count = 0
+        self.total = 0
+
+
+class StatsRingBuffer(RingBuffer):
+    """Ring buffer maintaining the sum and the sum of squares of its newest
+    `stats_size` values, so that their mean and variance are available in
+    constant time. Sums are recomputed from scratch every `size` values, so
+    that rounding errors do not accumulate. They are kept in float64, whatever
+    the type of the buffer.
+    """
+
+    def __init__(self, size, stats_size, dtype="float64"):
+        RingBuffer.__init__(self, size, dtype=dtype)
+        self.stats_size = stats_size
+        self.sum = 0
+        self.sum_squares = 0
+
+    def append(self, value):
+        if self.count >= self.stats_size:
+            old = float(self.buffer[self.cursor + self.size - self.stats_size])
+            self.sum -= old
+            self.sum_squares -= old * old
+        RingBuffer.append(self, value)
+        value = float(value)
+        self.sum += value
+        self.sum_squares += value * value
+        if self.total % self.size == 0:
+            self.update_sums()
+
+    def push(self, values):
+        RingBuffer.push(self, values)
+        self.update_sums()
+
+    def update_sums(self):
+        stats_values = self.latest(min(self.count, self.stats_size)).astype("float64", copy=False)
+        self.sum = numpy.sum(stats_values)
+        self.sum_squares = numpy.dot(stats_values, stats_values)
+
+    @property
+    def mean(self):
+        return self.sum / min(self.count, self.stats_size)
+
+    @property
+    def var(self):
+        n = min(self.count, self.stats_size)
+        return max(0, self.sum_squares / n - (self.sum / n) ** 2)
+
+    def clear(self):
+        RingBuffer.clear(self)
+        self.sum = 0
+        self.sum_squares = 0
+
+
+class ShiftRingBuffer:
+    """Fixed-size buffer, shifted by one position at each step: its first value
+    is dropped and a zero is appended at its end. Values are never moved, only
+    the index of the first value is, so adding an array to the whole buffer
+    only takes two slice operations.
+    """
+
+    def __init__(self, size, dtype="float64"):
+        self.size = size
+        self.data = numpy.zeros(size, dtype=dtype)
+        self.head = 0
+
+    def shift(self):
+        self.data[self.head] = 0
+        self.head += 1
+        if self.head == self.size:
+            self.head = 0
+
+    def add(self, values):
+        """Add an array of `size` values to the buffer, element-wise.
+        """
+        k = self.size - self.head
+        self.data[self.head:] += values[:k]
+        self.data[:self.head] += values[k:]
+
+    def __getitem__(self, i):
+        return self.data[(self.head + i) % self.size]
+
+    def max(self):
+        """Maximum value of the buffer, read from the unordered storage.
+        """
+        return self.data.max()
+
+    @property
+    def values(self):
+        """Copy of the buffer values, in order.
+        """
+        return numpy.concatenate([self.data[self.head:], self.data[:self.head]])
+
+    def clear(self):
+        self.data[:] = 0
+        self.head = 0
@@ -1,9 +1,13 @@
 from .annotator import Annotator
+from .batch import Batch
+from .cache_manager import CacheManager
 from .directogram import Directogram
 from .dummy import Dummy
 
 TOOL_LIST = [
     Annotator,
+    Batch,
+    CacheManager,
     Directogram,
-    Dummy
+    Dummy,
 ]
\ No newline at end of file
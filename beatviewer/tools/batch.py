@@ -0,0 +1,167 @@
+import glob
+import json
+import logging
+import multiprocessing
+import os
+import time
+
+import tqdm
+
+from ..analysis_cache import AnalysisCache
+from ..audio_source.ffmpeg_audio_source import FFmpegAudioSource
+from ..audio_source.file_audio_source import FileAudioSource
+from ..beat_tracker import BeatTracker, EventFlag
+from ..config import Config
+from .tool import Tool
+
+
+AUDIO_EXTENSIONS = {".aac", ".aif", ".aiff", ".flac", ".m4a", ".mp3", ".ogg", ".opus", ".wav", ".wma"}
+INDEX_FILENAME = "index.json"
+
+# Per-worker state, set once by init_worker
+worker_config = None
+worker_options = None
+
+
+def init_worker(config_path, engine, warmup, cache_dir):
+    """Load the config once per worker process. Kernels and pulse trains are
+    cached at module level, so they are also computed once per worker.
+    """
+    global worker_config, worker_options
+    logging.getLogger().setLevel(logging.WARNING)
+    worker_config = Config() if config_path is None else Config.from_file(config_path)
+    worker_options = {
+        "engine": engine,
+        "warmup": warmup and engine == BeatTracker.ENGINE_CAUSAL,
+        "analysis_cache": None if cache_dir is None else AnalysisCache(cache_dir),
+    }
+
+
+def analyze_track(task):
+    """Analyze an audio file in a worker process, and write its events to
+    the output path. The file is written under a temporary name first, so
+    that interrupted analyses leave no output. Return the index entry of the
+    track.
+    """
+    path, output_path = task
+    entry = {"path": path, "output": output_path}
+    temp_path = output_path + ".tmp"
+    start = time.perf_counter()
+    try:
+        source_class = FileAudioSource if FileAudioSource.is_supported(path) else FFmpegAudioSource
+        audio_source = source_class(worker_config, path, pbar_kwargs={"disable": True})
+        tracker = BeatTracker(worker_config, audio_source, output_path=temp_path, **worker_options)
+        tracker.run()
+        os.replace(temp_path, output_path)
+    except Exception as err:
+        logging.exception("Could not analyze '%s'", path)
+        if os.path.isfile(temp_path):
+            os.remove(temp_path)
+        entry["status"] = "error"
+        entry["error"] = f"{type(err).__name__}: {err}"
+        return entry
+    duration = tracker.frame_index / tracker.sampling_rate_oss
+    tempi = [(event.time, event.value) for event in tracker.events if event.flag == EventFlag.BPM]
+    tempo_durations = {}
+    for (t, bpm), (t_next, _) in zip(tempi, tempi[1:] + [(duration, None)]):
+        tempo_durations[bpm] = tempo_durations.get(bpm, 0) + t_next - t
+    entry["status"] = "ok"
+    entry["duration"] = duration
+    entry["beats"] = sum(1 for event in tracker.events if event.flag == EventFlag.BEAT)
+    entry["onsets"] = sum(1 for event in tracker.events if event.flag == EventFlag.ONSET)
+    # Tempo in effect for the longest time
+    entry["bpm"] = max(tempo_durations, key=tempo_durations.get) if tempo_durations else None
+    entry["elapsed"] = time.perf_counter() - start
+    return entry
+
+
+class Batch(Tool):
+
+    NAME = "batch"
+
+    def __init__(self, inputs, output_dir, config_path=None, engine=BeatTracker.ENGINE_CAUSAL,
+                 warmup=False, jobs=None, cache_dir=None, force=False):
+        Tool.__init__(self)
+        self.inputs = inputs
+        self.output_dir = output_dir
+        self.config_path = config_path
+        self.engine = engine
+        self.warmup = warmup
+        self.jobs = jobs if jobs is not None else os.cpu_count()
+        self.cache_dir = cache_dir
+        self.force = force
+
+    @staticmethod
+    def add_arguments(parser):
+        parser.add_argument("inputs", type=str, nargs="+", help="Audio files, directories (searched recursively) or glob patterns")
+        parser.add_argument("-o", "--output-dir", type=str, default="beats", help="Directory where event files and the summary index are written")
+        parser.add_argument("-e", "--engine", type=str, default=BeatTracker.ENGINE_CAUSAL, choices=[BeatTracker.ENGINE_CAUSAL, BeatTracker.ENGINE_OFFLINE], help="Beat tracking engine")
+        parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count(), help="Number of worker processes")
+        parser.add_argument("--cache-dir", type=str, default=None, help="Path to an analysis cache directory shared by the workers")
+        parser.add_argument("--force", action="store_true", help="Analyze again the files whose event file already exists")
+
+    @classmethod
+    def from_args(cls, args):
+        obj = cls.from_keys(args, ["inputs", "output_dir"], ["engine", "warmup", "jobs", "cache_dir", "force"])
+        obj.config_path = args.config
+        return obj
+
+    def find_tracks(self):
+        """Expand the inputs into a sorted list of audio file paths.
+        """
+        paths = set()
+        for pattern in self.inputs:
+            if os.path.isdir(pattern):
+                for root, _, filenames in os.walk(pattern):
+                    for filename in filenames:
+                        if os.path.splitext(filename)[1].lower() in AUDIO_EXTENSIONS:
+                            paths.add(os.path.join(root, filename))
+            else:
+                paths.update(path for path in glob.glob(pattern, recursive=True) if os.path.isfile(path))
+        return sorted(os.path.abspath(path) for path in paths)
+
+    def get_output_path(self, path, root):
+        """Mirror the path of an audio file, relative to the common root of
+        all tracks, into the output directory. The extension of the audio file
+        is kept, so that files with the same stem get distinct outputs.
+        """
+        relative = os.path.relpath(path, root)
+        return os.path.join(self.output_dir, relative + ".json")
+
+    def save_index(self, index):
+        index_path = os.path.join(self.output_dir, INDEX_FILENAME)
+        with open(index_path + ".tmp", "w", encoding="utf8") as file:
+            json.dump(index, file, indent=4)
+        os.replace(index_path + ".tmp", index_path)
+
+    def run(self):
+        tracks = self.find_tracks()
+        if not tracks:
+            print("No audio file found")
+            return
+        root = os.path.commonpath([os.path.dirname(path) for path in tracks])
+        os.makedirs(self.output_dir, exist_ok=True)
+        index_path = os.path.join(self.output_dir, INDEX_FILENAME)
+        index = {"tracks": {}}
+        if os.path.isfile(index_path):
+            with open(index_path, "r", encoding="utf8") as file:
+                index = json.load(file)
+        tasks = []
+        for path in tracks:
+            output_path = self.get_output_path(path, root)
+            if not self.force and os.path.isfile(output_path):
+                continue
+            os.makedirs(os.path.dirname(output_path), exist_ok=True)
+            tasks.append((path, output_path))
+        print(f"Found {len(tracks)} tracks, {len(tracks) - len(tasks)} already analyzed")
+        logging.info("Analyzing %d tracks with %d workers", len(tasks), self.jobs)
+        initargs = (self.config_path, self.engine, self.warmup, self.cache_dir)
+        failures = 0
+        with multiprocessing.Pool(self.jobs, initializer=init_worker, initargs=initargs) as pool:
+            for entry in tqdm.tqdm(pool.imap_unordered(analyze_track, tasks), total=len(tasks), unit="track"):
+                index["tracks"][os.path.relpath(entry["output"], self.output_dir)] = entry
+                self.save_index(index)
+                if entry["status"] != "ok":
+                    failures += 1
+                    print(f"Failed to analyze '{entry['path']}': {entry['error']}")
+        print(f"Analyzed {len(tasks) - failures} tracks, {failures} failures, index written to {index_path}")
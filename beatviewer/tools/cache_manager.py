@@ -0,0 +1,43 @@
+import datetime
+import os
+
+from ..analysis_cache import DEFAULT_CACHE_DIR, DEFAULT_MAX_SIZE, AnalysisCache
+from .tool import Tool
+
+
+class CacheManager(Tool):
+
+    NAME = "cache"
+
+    def __init__(self, command, path=DEFAULT_CACHE_DIR, max_size=DEFAULT_MAX_SIZE / 2 ** 20):
+        Tool.__init__(self)
+        self.command = command
+        self.cache = AnalysisCache(path, int(max_size * 2 ** 20))
+
+    @staticmethod
+    def add_arguments(parser):
+        parser.add_argument("command", type=str, choices=["list", "trim", "clear"], help="List the cached entries, evict the least recently used ones until the cache fits in the maximum size, or remove all of them")
+        parser.add_argument("-p", "--path", type=str, default=DEFAULT_CACHE_DIR, help="Path to the analysis cache directory")
+        parser.add_argument("-m", "--max-size", type=float, default=DEFAULT_MAX_SIZE / 2 ** 20, help="Maximum size of the cache, in MB")
+
+    @classmethod
+    def from_args(cls, args):
+        return cls.from_keys(args, ["command"], ["path", "max_size"])
+
+    def run(self):
+        if self.command == "trim":
+            print(f"Removed {self.cache.evict()} entries")
+        elif self.command == "clear":
+            print(f"Removed {self.cache.clear()} entries")
+        entries = self.cache.entries()
+        for entry in entries:
+            print("\t".join([
+                datetime.datetime.fromtimestamp(entry["accessed"]).strftime("%Y-%m-%d %H:%M:%S"),
+                f"{entry['size'] / 2 ** 20:.1f} MB",
+                entry["meta"]["stage"],
+                os.path.basename(entry["meta"].get("path", "")),
+            ]))
+        print(
+            f"{len(entries)} entries, {sum(entry['size'] for entry in entries) / 2 ** 20:.1f} MB"
+            f" of {self.cache.max_size / 2 ** 20:.1f} MB in {self.cache.path}"
+        )
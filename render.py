@@ -7,7 +7,8 @@ import tempfile
 import numpy
 import tqdm
 
-from beatviewer import BeatTracker, Config, FileAudioSource
+from beatviewer import AnalysisCache, BeatTracker, Config, FileAudioSource, FFmpegAudioSource
+from beatviewer.analysis_cache import DEFAULT_CACHE_DIR
 from beatviewer.video.video_reader import VideoReader
 from beatviewer.beat_tracker import EventFlag, BeatTrackingEvent
 
@@ -56,7 +57,8 @@ class FFmpegVideoOutput:
 
 class Renderer:
 
-    def __init__(self, audio_path: str, video_path: str, output_path: str, config: Config):
+    def __init__(self, audio_path: str, video_path: str, output_path: str, config: Config,
+                 engine: str = BeatTracker.ENGINE_CAUSAL, analysis_cache: AnalysisCache | None = None):
         self.audio_path = audio_path
         self.video_path = video_path
         self.output_path = output_path
@@ -66,12 +68,19 @@ class Renderer:
         self.event_cursor: int = 0
         self.reader = VideoReader(self.video_path)
         self.config = config
+        self.engine = engine
+        self.analysis_cache = analysis_cache
 
     def analyze_audio(self):
-        audio_source = FileAudioSource(self.config, self.audio_path, pbar_kwargs={
+        source_class = FileAudioSource
+        if not FileAudioSource.is_supported(self.audio_path):
+            source_class = FFmpegAudioSource
+        audio_source = source_class(self.config, self.audio_path, pbar_kwargs={
             "desc": "Analyzing audio"
         })
-        tracker = BeatTracker(self.config, audio_source, register_events=True, warmup=True)
+        tracker = BeatTracker(self.config, audio_source, register_events=True,
+                              warmup=self.engine == BeatTracker.ENGINE_CAUSAL, engine=self.engine,
+                              analysis_cache=self.analysis_cache)
         tracker.run()
         self.events = tracker.events
         self.duration = tracker.frame_index / tracker.sampling_rate_oss
@@ -95,6 +104,8 @@ class Renderer:
             "-stats",
             "-i", aux_path,
             "-i", self.audio_path,
+            "-map", "0:v:0",
+            "-map", "1:a:0",
             "-c:v", "copy",
             "-c:a", "aac",
             self.output_path,
@@ -126,8 +137,9 @@ class SeekOnBeatRenderer(Renderer):
 
 class SlowDownRenderer(Renderer):
 
-    def __init__(self, audio_path: str, video_path: str, output_path: str, config: Config, decay: float, jumpcut: bool):
-        Renderer.__init__(self, audio_path, video_path, output_path, config)
+    def __init__(self, audio_path: str, video_path: str, output_path: str, config: Config, decay: float, jumpcut: bool,
+                 engine: str = BeatTracker.ENGINE_CAUSAL, analysis_cache: AnalysisCache | None = None):
+        Renderer.__init__(self, audio_path, video_path, output_path, config, engine, analysis_cache)
         self.decay = decay
         self.jumpcut = jumpcut
         self.playback_speed = 1
@@ -145,12 +157,13 @@ class SlowDownRenderer(Renderer):
 
 def pipeline(audio_path: str, video_path: str, output_path: str, mode: str,
              config: Config, decay: float = 0.9, jumpcut: bool = False,
-             execute: bool = True):
+             execute: bool = True, engine: str = BeatTracker.ENGINE_CAUSAL,
+             analysis_cache: AnalysisCache | None = None):
     base_args = [audio_path, video_path, output_path, config]
     if mode == "seek":
-        renderer = SeekOnBeatRenderer(*base_args)
+        renderer = SeekOnBeatRenderer(*base_args, engine=engine, analysis_cache=analysis_cache)
     elif mode == "slow":
-        renderer = SlowDownRenderer(*base_args, decay=decay, jumpcut=jumpcut)
+        renderer = SlowDownRenderer(*base_args, decay=decay, jumpcut=jumpcut, engine=engine, analysis_cache=analysis_cache)
     else:
         raise ValueError(f"Invalid mode: {mode}")
     renderer.run()
@@ -170,13 +183,19 @@ def main():
     parser.add_argument("-m", "--mode", type=str, default="seek", choices=["seek", "slow"])
     parser.add_argument("-d", "--decay", type=float, default=0.9)
     parser.add_argument("-j", "--jumpcut", action="store_true")
+    parser.add_argument("-e", "--engine", type=str, default=BeatTracker.ENGINE_CAUSAL,
+                        choices=[BeatTracker.ENGINE_CAUSAL, BeatTracker.ENGINE_OFFLINE],
+                        help="Beat tracking engine: the real-time causal pipeline, or a whole-track dynamic programming pass")
+    parser.add_argument("--cache-dir", type=str, default=DEFAULT_CACHE_DIR, help="Path to the analysis cache directory")
+    parser.add_argument("--no-cache", action="store_true", help="Analyze the audio from scratch, without reading or writing the analysis cache")
     args = parser.parse_args()
     if args.config is not None:
         config = Config.from_file(args.config)
     else:
         config = Config(bps_epsilon_t=0)
+    analysis_cache = None if args.no_cache else AnalysisCache(args.cache_dir)
     pipeline(args.audio_path, args.video_path, args.output_path, args.mode,
-             config, args.decay, args.jumpcut)
+             config, args.decay, args.jumpcut, engine=args.engine, analysis_cache=analysis_cache)
 
 
 if __name__ == "__main__":
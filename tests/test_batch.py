@@ -0,0 +1,30 @@
+import json
+import os
+
+import numpy
+import soundfile
+
+from beatviewer.tools.batch import INDEX_FILENAME, Batch
+
+
+def write_noise(path, duration=3, sampling_rate=44100):
+    rng = numpy.random.default_rng(0)
+    soundfile.write(path, rng.normal(0, 1000, duration * sampling_rate).astype("int16"), sampling_rate)
+
+
+def test_same_stem_tracks(tmp_path, capsys):
+    tracks_dir = tmp_path / "tracks"
+    output_dir = tmp_path / "beats"
+    tracks_dir.mkdir()
+    write_noise(tracks_dir / "song.wav")
+    write_noise(tracks_dir / "song.flac")
+    Batch([str(tracks_dir)], str(output_dir), jobs=1).run()
+    assert os.path.isfile(output_dir / "song.wav.json")
+    assert os.path.isfile(output_dir / "song.flac.json")
+    with open(output_dir / INDEX_FILENAME, "r", encoding="utf8") as file:
+        index = json.load(file)
+    assert sorted(index["tracks"]) == ["song.flac.json", "song.wav.json"]
+    assert all(entry["status"] == "ok" for entry in index["tracks"].values())
+    capsys.readouterr()
+    Batch([str(tracks_dir)], str(output_dir), jobs=1).run()
+    assert "Found 2 tracks, 2 already analyzed" in capsys.readouterr().out
@@ -0,0 +1,27 @@
+import numpy
+import pytest
+import soundfile
+
+from beatviewer import BeatTracker, Config, FileAudioSource
+
+
+class HopByHopAudioSource(FileAudioSource):
+
+    offline = False
+
+
+def track(audio_source_class, path, **config_kwargs):
+    config = Config(**config_kwargs)
+    audio_source = audio_source_class(config, path, pbar_kwargs={"disable": True})
+    tracker = BeatTracker(config, audio_source, register_events=True)
+    tracker.run()
+    return tracker.frame_index, [(event.flag, event.frame) for event in tracker.events]
+
+
+@pytest.mark.parametrize("analysis_sampling_rate", [0, 16000, 22050, 48000])
+def test_offline_matches_hop_by_hop(tmp_path, analysis_sampling_rate):
+    path = str(tmp_path / "noise.wav")
+    rng = numpy.random.default_rng(0)
+    soundfile.write(path, rng.normal(0, 3000, 10 * 44100 + 123).astype("int16"), 44100)
+    reference = track(HopByHopAudioSource, path, analysis_sampling_rate=analysis_sampling_rate)
+    assert track(FileAudioSource, path, analysis_sampling_rate=analysis_sampling_rate) == reference
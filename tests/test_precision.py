@@ -0,0 +1,55 @@
+import numpy
+import pytest
+import soundfile
+
+from beatviewer import BeatTracker, Config, FileAudioSource
+from beatviewer.beat_tracker import EventFlag
+
+
+def write_click_track(path, bpm=124, duration=30, sampling_rate=44100, seed=0):
+    """Write decaying 80 Hz clicks on the beats and softer 3 kHz clicks on the
+    off-beats, over a low noise floor.
+    """
+    rng = numpy.random.default_rng(seed)
+    n = int(duration * sampling_rate)
+    signal = rng.normal(0, 300, n)
+    period = int(60 / bpm * sampling_rate)
+    t = numpy.arange(2000)
+    click = 12000 * numpy.exp(-t / 300) * numpy.sin(2 * numpy.pi * 80 * t / sampling_rate)
+    for start in range(1000, n - 2000, period):
+        signal[start:start + 2000] += click
+    for start in range(1000 + period // 2, n - 2000, period):
+        signal[start:start + 1000] += .5 * click[:1000] * numpy.sin(2 * numpy.pi * 3000 * t[:1000] / sampling_rate)
+    soundfile.write(path, numpy.clip(signal, -32000, 32000).astype("int16"), sampling_rate, subtype="PCM_16")
+
+
+def track_events(path, dtype):
+    config = Config(pipeline_dtype=dtype)
+    audio_source = FileAudioSource(config, path, pbar_kwargs={"disable": True})
+    tracker = BeatTracker(config, audio_source, register_events=True)
+    tracker.run()
+    return {
+        flag: [event.time for event in tracker.events if event.flag == flag]
+        for flag in [EventFlag.BEAT, EventFlag.ONSET]
+    }
+
+
+def test_float32_matches_float64(tmp_path):
+    path = str(tmp_path / "clicks.wav")
+    write_click_track(path)
+    reference = track_events(path, "float64")
+    events = track_events(path, "float32")
+    assert len(reference[EventFlag.BEAT]) > 0
+    assert events[EventFlag.BEAT] == reference[EventFlag.BEAT]
+    assert events[EventFlag.ONSET] == reference[EventFlag.ONSET]
+
+
+def test_follower_dtype_must_match(tmp_path):
+    path = str(tmp_path / "clicks.wav")
+    write_click_track(path, duration=1)
+    config = Config(pipeline_dtype="float32")
+    audio_source = FileAudioSource(config, path, pbar_kwargs={"disable": True})
+    leader = BeatTracker(config, audio_source)
+    with pytest.raises(ValueError):
+        leader.add_follower(BeatTracker(Config(pipeline_dtype="float64"), audio_source))
+    leader.add_follower(BeatTracker(Config(pipeline_dtype="float32"), audio_source))